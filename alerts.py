@@ -0,0 +1,96 @@
+import logging
+import os
+import time
+
+from metrics import ALERTS_RAISED, ALERTS_SENT, ALERTS_SUPPRESSED
+from ratelimit import RateLimiter
+
+# ==========================
+# CONFIG
+# ==========================
+
+# Non-critical alerts are held and sent as one digest per interval
+ALERT_DIGEST_INTERVAL = int(os.getenv("ALERT_DIGEST_INTERVAL", "300"))
+
+# Budget for alert messages to the admin chat, independent of user traffic
+ALERT_BURST = float(os.getenv("ALERT_BURST", "3"))
+ALERT_PER_HOUR = float(os.getenv("ALERT_PER_HOUR", "12"))
+
+# A critical alert bypasses the digest, at most once per fingerprint here
+ALERT_CRITICAL_COOLDOWN = int(os.getenv("ALERT_CRITICAL_COOLDOWN", "900"))
+
+INFO, WARNING, ERROR, CRITICAL = "info", "warning", "error", "critical"
+SEVERITIES = (CRITICAL, ERROR, WARNING, INFO)
+
+ICONS = {CRITICAL: "🔥", ERROR: "🚨", WARNING: "⚠️", INFO: "ℹ️"}
+
+# ==========================
+# ALERTER
+# ==========================
+
+class Alerter:
+    # Alerts are keyed by a fingerprint (e.g. "heartbeat", "backup"); any
+    # number of repeats between two digests become one line with a count.
+
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+        self.pending = {}  # fingerprint -> [severity, message, count, first, last]
+        self.critical_sent = {}  # fingerprint -> monotonic time
+        self.limiter = RateLimiter(burst=ALERT_BURST, per_minute=ALERT_PER_HOUR / 60)
+
+    async def alert(self, bot, fingerprint, message, severity=ERROR):
+        ALERTS_RAISED.labels(severity=severity).inc()
+        now = time.time()
+
+        entry = self.pending.get(fingerprint)
+        if entry is None:
+            self.pending[fingerprint] = [severity, message, 1, now, now]
+        else:
+            ALERTS_SUPPRESSED.labels(reason="duplicate").inc()
+            if SEVERITIES.index(severity) < SEVERITIES.index(entry[0]):
+                entry[0] = severity
+            entry[1] = message
+            entry[2] += 1
+            entry[4] = now
+
+        if severity == CRITICAL:
+            last = self.critical_sent.get(fingerprint)
+            if last is None or time.monotonic() - last >= ALERT_CRITICAL_COOLDOWN:
+                self.critical_sent[fingerprint] = time.monotonic()
+                await self.flush(bot)
+
+    async def flush(self, bot):
+        # Sends everything pending as one digest; if over budget, it stays
+        # pending and goes out with the next one
+        if not self.pending:
+            return
+
+        allowed, _ = self.limiter.allow(self.chat_id)
+        if not allowed:
+            ALERTS_SUPPRESSED.labels(reason="rate_limited").inc()
+            return
+
+        pending, self.pending = self.pending, {}
+        try:
+            await bot.send_message(chat_id=self.chat_id, text=self._digest(pending))
+            ALERTS_SENT.inc()
+        except Exception as e:
+            logging.error(f"Failed to send alert: {e}")
+            # Put them back, merged with anything raised meanwhile
+            for fingerprint, entry in pending.items():
+                current = self.pending.setdefault(fingerprint, entry)
+                if current is not entry:
+                    current[2] += entry[2]
+                    current[3] = entry[3]
+
+    @staticmethod
+    def _digest(pending):
+        entries = sorted(
+            pending.values(), key=lambda e: (SEVERITIES.index(e[0]), -e[4])
+        )
+        lines = ["🚨 BOT ALERT" if len(entries) == 1 else f"🚨 BOT ALERTS ({len(entries)})"]
+        for severity, message, count, first, last in entries:
+            repeats = f" (×{count} since {time.strftime('%H:%M', time.gmtime(first))} UTC)" if count > 1 else ""
+            lines.append(f"\n{ICONS[severity]} {severity.upper()}{repeats}\n{message}")
+        # Telegram's message limit
+        return "\n".join(lines)[:4000]
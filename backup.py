@@ -0,0 +1,112 @@
+import asyncio
+import glob
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+from metrics import (
+    BACKUP_DURATION,
+    BACKUP_FAILURES,
+    BACKUP_LAST_SUCCESS,
+    BACKUP_RESTORES
+)
+
+# ==========================
+# CONFIG
+# ==========================
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "/data/backups")
+BACKUP_INTERVAL = int(os.getenv("BACKUP_INTERVAL", "3600"))   # seconds
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "24"))             # snapshots kept
+BACKUP_PAGES = int(os.getenv("BACKUP_PAGES", "64"))           # pages per step
+BACKUP_STEP_PAUSE = float(os.getenv("BACKUP_STEP_PAUSE", "0.005"))
+
+# ==========================
+# SNAPSHOTS
+# ==========================
+
+def _snapshots(name):
+    # Timestamped names sort chronologically; the digit keeps "jobs" from
+    # also matching the "jobs-shard0" snapshots
+    return sorted(glob.glob(os.path.join(BACKUP_DIR, f"{name}-[0-9]*.db")))
+
+def _copy_online(src, dest_path):
+    # SQLite only holds the source lock for one step of BACKUP_PAGES pages;
+    # the pause between steps lets handler writes go through
+    def progress(status, remaining, total):
+        if remaining:
+            time.sleep(BACKUP_STEP_PAUSE)
+
+    dest = sqlite3.connect(dest_path)
+    try:
+        src.backup(dest, pages=BACKUP_PAGES, progress=progress)
+    finally:
+        dest.close()
+
+def _prune(name):
+    for old in _snapshots(name)[:-BACKUP_KEEP]:
+        try:
+            os.remove(old)
+        except OSError:
+            logging.warning(f"Could not remove old snapshot {old}")
+
+async def snapshot(conn, name="jobs"):
+    # `conn` must be the connection the bot writes through: its writes are
+    # applied to the in-progress copy, while writes from any other
+    # connection make SQLite restart the backup from page one.
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    path = os.path.join(BACKUP_DIR, f"{name}-{stamp}.db")
+    tmp_path = path + ".tmp"
+
+    started = time.perf_counter()
+    try:
+        # Runs off the event loop so handlers keep being served
+        await asyncio.to_thread(_copy_online, conn, tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        BACKUP_FAILURES.inc()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    BACKUP_DURATION.observe(time.perf_counter() - started)
+    BACKUP_LAST_SUCCESS.set_to_current_time()
+
+    _prune(name)
+    logging.info(f"Snapshot written: {path}")
+    return path
+
+# ==========================
+# RESTORE
+# ==========================
+
+def restore_if_missing(db_path, name="jobs"):
+    # Must run before anything opens `db_path`
+    if os.path.exists(db_path):
+        return None
+
+    snapshots = _snapshots(name)
+    if not snapshots:
+        logging.info("No database and no snapshot found, starting fresh")
+        return None
+
+    latest = snapshots[-1]
+
+    # Leftover WAL files belong to the lost database, not the snapshot
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    tmp_path = db_path + ".restore"
+    shutil.copyfile(latest, tmp_path)
+    os.replace(tmp_path, db_path)
+
+    BACKUP_RESTORES.inc()
+    logging.warning(f"Database restored from snapshot {latest}")
+    return latest
@@ -0,0 +1,65 @@
+# Cold-start benchmark: starts fresh interpreters that import bot.py and
+# open the database the way post_init does, then prints the median of each
+# start-up phase. Telegram is not contacted, so initialize / first_poll are
+# not part of the numbers.
+#
+#   python bench_cold_start.py [runs]
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = """
+import asyncio, json, time
+import startup
+import bot
+
+async def open_db():
+    await bot.db.connect()
+    await bot.db.close()
+
+with startup.phase("db_total"):
+    asyncio.run(open_db())
+print(json.dumps(dict(startup.phases, total=startup.elapsed())))
+"""
+
+def run_once(db_path):
+    env = dict(
+        os.environ,
+        BOT_TOKEN=os.environ.get("BOT_TOKEN", "0:benchmark"),
+        DB_PATH=db_path,
+        BACKUP_DIR=os.path.join(os.path.dirname(db_path), "backups"),
+        STORAGE_BACKEND="sqlite",
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def report(title, samples):
+    print(f"\n{title} ({len(samples)} runs, median ms)")
+    for name in samples[0]:
+        values = [s.get(name, 0.0) * 1000 for s in samples]
+        print(f"  {name:<12} {statistics.median(values):8.1f}")
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Fresh volume: schema created from scratch every run
+        fresh = [run_once(os.path.join(tmp, f"fresh-{i}.db")) for i in range(runs)]
+
+        # Restart: the database already exists
+        existing = os.path.join(tmp, "jobs.db")
+        run_once(existing)
+        warm = [run_once(existing) for _ in range(runs)]
+
+    report("First start (new database)", fresh)
+    report("Restart (existing database)", warm)
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-import pytz
+import startup
 from telegram import Update
 from telegram.ext import (
     ApplicationBuilder,
@@ -11,13 +11,26 @@ from metrics import (
     MESSAGE_LATENCY,
     start_metrics_server
 )
+import alerts
+import backup
+import bulk
+import cluster
+import delivery
+import lifecycle
+import tracing
+from ratelimit import guarded
+from storage import create_storage, search_terms
 from telegram.ext import MessageHandler, filters
+import asyncio
+import csv
 import os
+import tempfile
 from datetime import datetime, timedelta, time, timezone
-import pytz
-import sqlite3
+from zoneinfo import ZoneInfo
 import logging
 
+startup.mark("imports")
+
 
 logging.basicConfig(
     level=logging.INFO,
@@ -25,80 +38,20 @@ logging.basicConfig(
 )
 ADMIN_CHAT_ID = int(os.getenv("ADMIN_CHAT_ID", "1683148040"))
 
-IST = pytz.timezone("Asia/Kolkata")
-
-# ========================
-# applied_jobs table
-# ========================
-
-conn = sqlite3.connect("/data/jobs.db", check_same_thread=False)
-cursor = conn.cursor()
-cursor.execute("PRAGMA journal_mode=WAL;")
-cursor.execute("PRAGMA synchronous=NORMAL;")
-conn.commit()
-
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS applied_jobs (
-    user_id INTEGER,
-    company TEXT,
-    role TEXT,
-    applied_at TEXT,
-    UNIQUE(user_id, company, role)
-)
-""")
-conn.commit()
+IST = ZoneInfo("Asia/Kolkata")
 
 # ========================
-# DB MIGRATION (ONE-TIME SAFE)
+# STORAGE
 # ========================
 
-cursor.execute("PRAGMA table_info(applied_jobs)")
-columns = [c[1] for c in cursor.fetchall()]
-
-if "followup_after" not in columns:
-    cursor.execute(
-        "ALTER TABLE applied_jobs ADD COLUMN followup_after INTEGER DEFAULT 5"
-    )
-
-if "link" not in columns:
-    cursor.execute(
-        "ALTER TABLE applied_jobs ADD COLUMN link TEXT"
-    )
-
-conn.commit()
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS user_skills (
-    user_id INTEGER PRIMARY KEY,
-    skills TEXT,
-    location TEXT DEFAULT 'india',
-    exp_min INTEGER DEFAULT 0,
-    exp_max INTEGER DEFAULT 30,
-    work_mode TEXT
-)
-""")
-conn.commit()
-
-# cursor.execute("""
-# ALTER TABLE user_skills
-# ADD COLUMN active INTEGER DEFAULT 1
-# """)
-# conn.commit()
-cursor.execute("PRAGMA table_info(user_skills)")
-columns = [c[1] for c in cursor.fetchall()]
-
-if "active" not in columns:
-    cursor.execute(
-        "ALTER TABLE user_skills ADD COLUMN active INTEGER DEFAULT 1"
-    )
+# DB access goes through the storage backend (SQLite by default)
+db = create_storage()
 
-if "last_job_url" not in columns:
-    cursor.execute(
-        "ALTER TABLE user_skills ADD COLUMN last_job_url TEXT"
-    )
+# Only one replica seeds scheduled broadcasts; all of them help deliver
+leader = cluster.LeaderElection(db)
 
-conn.commit()
+# Admin alerts are deduplicated and sent as periodic digests
+alerter = alerts.Alerter(ADMIN_CHAT_ID)
 
 # ==========================
 # CONFIG
@@ -109,6 +62,14 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 if not BOT_TOKEN:
     raise RuntimeError("BOT_TOKEN is not set")
 
+# Exactly one replica may poll getUpdates (Telegram answers 409 to the
+# rest); set 0 on extra replicas so they only run the scheduler and claim
+# broadcast partitions
+BOT_POLLING = os.getenv("BOT_POLLING", "1") == "1"
+
+# Matches per /search page
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "10"))
+
 # ==========================
 # COMMAND HANDLERS
 # ==========================
@@ -116,12 +77,7 @@ if not BOT_TOKEN:
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
-    cursor.execute("""
-        INSERT INTO user_skills (user_id, active)
-        VALUES (?, 1)
-        ON CONFLICT(user_id) DO UPDATE SET active = 1
-    """, (user_id,))
-    conn.commit()
+    await db.activate_user(user_id)
 
     await update.message.reply_text(
     "👋 Welcome to Job Seeker Bot!\n\n"
@@ -131,20 +87,16 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def set_skills(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not context.args:
         # If no args → show current skills
-        cursor.execute(
-            "SELECT skills FROM user_skills WHERE user_id = ?",
-            (update.effective_user.id,)
-        )
-        row = cursor.fetchone()
+        profile = await db.get_profile(update.effective_user.id)
 
-        if not row or not row[0]:
+        if not profile or not profile.skills:
             await update.message.reply_text(
                 "❌ No skills set yet.\n"
                 "Usage:\n/skills aws,docker,python"
             )
         else:
             await update.message.reply_text(
-                f"🧠 Your current skills:\n✅ {row[0]}"
+                f"🧠 Your current skills:\n✅ {profile.skills}"
             )
         return
 
@@ -155,13 +107,7 @@ async def set_skills(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     user_id = update.effective_user.id
 
-    cursor.execute("""
-        INSERT INTO user_skills (user_id, skills, active)
-        VALUES (?, ?, 1)
-        ON CONFLICT(user_id)
-        DO UPDATE SET skills = excluded.skills
-    """, (user_id, skills))
-    conn.commit()
+    await db.upsert_skills(user_id, skills)
 
     await update.message.reply_text(
         f"✅ Skills updated:\n{skills}"
@@ -170,32 +116,24 @@ async def set_skills(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def my_skills(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
-    cursor.execute(
-        "SELECT skills FROM user_skills WHERE user_id = ?",
-        (user_id,)
-    )
-    row = cursor.fetchone()
+    profile = await db.get_profile(user_id)
 
-    if not row:
+    if not profile:
         await update.message.reply_text(
             "❌ No skills set yet.\nUse /skills <role>"
         )
         return
 
     await update.message.reply_text(
-        f"🧠 Your current role:\n✅ {row[0]}"
+        f"🧠 Your current role:\n✅ {profile.skills}"
     )
 
 async def remind(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
-    cursor.execute(
-        "SELECT skills FROM user_skills WHERE user_id = ?",
-        (user_id,)
-    )
-    row = cursor.fetchone()
+    profile = await db.get_profile(user_id)
 
-    skills = row[0] if row else "your skills"
+    skills = profile.skills if profile else "your skills"
 
     await update.message.reply_text(
         "⏰ JOB REMINDER\n\n"
@@ -221,20 +159,15 @@ async def hrmsg(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def jobs(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
-    cursor.execute("""
-        SELECT skills, location, exp_min, work_mode, last_job_url, active
-        FROM user_skills
-        WHERE user_id = ?
-    """, (user_id,))
-    row = cursor.fetchone()
+    profile = await db.get_profile(user_id)
 
-    if not row:
+    if not profile:
         await update.message.reply_text(
             "❌ Profile not found.\nUse /skills to set your role first."
         )
         return
 
-    skills, location, exp_min, work_mode, last_url, active = row
+    _, skills, location, exp_min, _, work_mode, last_url, active = profile
 
     if not active:
         await update.message.reply_text(
@@ -256,11 +189,7 @@ async def jobs(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Save URL so next time it won’t spam
-    cursor.execute(
-        "UPDATE user_skills SET last_job_url = ? WHERE user_id = ?",
-        (link, user_id)
-    )
-    conn.commit()
+    await db.set_last_job_url(user_id, link)
 
     await update.message.reply_text(
         "🔥 Jobs matching your profile\n\n"
@@ -272,11 +201,7 @@ async def jobs(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def refresh_jobs(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
-    cursor.execute(
-        "UPDATE user_skills SET last_job_url = NULL WHERE user_id = ?",
-        (user_id,)
-    )
-    conn.commit()
+    await db.set_last_job_url(user_id, None)
 
     await update.message.reply_text(
         "🔄 Job cache cleared.\nFetching latest openings…"
@@ -316,19 +241,21 @@ async def applied(update: Update, context: ContextTypes.DEFAULT_TYPE):
     role = " ".join(role_words)
     user_id = update.effective_user.id
 
-    cursor.execute("""
-        INSERT INTO applied_jobs
-        (user_id, company, role, applied_at, followup_after, link)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (
+    added = await db.add_applied(
         user_id,
         company,
         role,
         datetime.now(timezone.utc).isoformat(),
         days,
         link
-    ))
-    conn.commit()
+    )
+
+    if not added:
+        await update.message.reply_text(
+            f"ℹ️ Already tracking: {company} – {role}\n"
+            "Use /list_applied to see it."
+        )
+        return
 
     await update.message.reply_text(
         f"✅ Saved: {company} – {role}\n"
@@ -339,19 +266,15 @@ async def applied(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def any_new_opening(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
-    cursor.execute("""
-        SELECT skills, location, exp_min, work_mode, last_job_url, active
-        FROM user_skills WHERE user_id = ?
-    """, (user_id,))
-    row = cursor.fetchone()
+    profile = await db.get_profile(user_id)
 
-    if not row:
+    if not profile:
         await update.message.reply_text(
             "❌ Profile not found.\nUse /skills first."
         )
         return
 
-    skills, location, exp_min, mode, last_url, active = row
+    _, skills, location, exp_min, _, mode, last_url, active = profile
 
     if not active:
         await update.message.reply_text(
@@ -373,11 +296,7 @@ async def any_new_opening(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Save new URL
-    cursor.execute(
-        "UPDATE user_skills SET last_job_url = ? WHERE user_id = ?",
-        (link, user_id)
-    )
-    conn.commit()
+    await db.set_last_job_url(user_id, link)
 
     await update.message.reply_text(
         "🔥 New opening found!\n\n"
@@ -390,12 +309,7 @@ async def any_new_opening(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def followups(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
-    cursor.execute("""
-        SELECT company, role, applied_at, followup_after, link
-        FROM applied_jobs
-        WHERE user_id = ?
-    """, (user_id,))
-    rows = cursor.fetchall()
+    rows = await db.list_applied(user_id)
 
     if not rows:
         await update.message.reply_text("📭 No follow-ups pending")
@@ -420,10 +334,17 @@ async def followups(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
     if not due:
         msg = "✅ No follow-ups due today"
+    else:
+        msg += "✍️ Need a message? /followupmsg"
 
     await update.message.reply_text(msg)
 
 async def followupmsg(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await db.log_action(
+        update.effective_user.id, "follow",
+        datetime.now(timezone.utc).isoformat()
+    )
+
     await update.message.reply_text(
         "Hi {{Name}},\n\n"
         "Following up on my application for {{Role}} at {{Company}}.\n"
@@ -431,14 +352,8 @@ async def followupmsg(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Thanks,\n{{Your Name}}"
     )
 
-async def daily_followup(context: ContextTypes.DEFAULT_TYPE):
-    cursor.execute("""
-        SELECT a.user_id, a.company, a.role, a.applied_at
-        FROM applied_jobs a
-        JOIN user_skills u ON a.user_id = u.user_id
-        WHERE u.active = 1
-    """)
-    rows = cursor.fetchall()
+async def daily_followup(context: ContextTypes.DEFAULT_TYPE, partition=None):
+    rows = await db.active_applied(partition)
 
     reminders = {}
 
@@ -454,36 +369,32 @@ async def daily_followup(context: ContextTypes.DEFAULT_TYPE):
             )
 
     for user_id, msgs in reminders.items():
-        await context.bot.send_message(
-            chat_id=user_id,
-            text="🔔 Follow-up Reminder\n\n" + "\n".join(msgs)
-
-        )
+        with tracing.span("recipient", **{"user.id": user_id}):
+            await delivery.send(
+                context.bot, db, user_id,
+                "🔔 Follow-up Reminder\n\n" + "\n".join(msgs)
+                + "\n\n✍️ Need a message? /followupmsg"
+            )
 
-async def daily_jobs(context: ContextTypes.DEFAULT_TYPE):
-    cursor.execute("""
-        SELECT user_id, skills, location, exp_min, work_mode, last_job_url
-        FROM user_skills
-        WHERE active = 1
-    """)
-    users = cursor.fetchall()
+async def daily_jobs(context: ContextTypes.DEFAULT_TYPE, partition=None):
+    users = await db.active_profiles(partition)
 
-    for user_id, skills, location, exp_min, work_mode, last_url in users:
+    for user_id, skills, location, exp_min, _, work_mode, last_url, _ in users:
+        with tracing.span("recipient", **{"user.id": user_id}):
 
-        link = build_naukri_url(
-            role=skills,
-            location=location,
-            exp_min=exp_min,
-            work_mode=work_mode
-        )
+            link = build_naukri_url(
+                role=skills,
+                location=location,
+                exp_min=exp_min,
+                work_mode=work_mode
+            )
 
-        # 🔁 Anti-spam: skip if same URL already sent
-        if last_url == link:
-            continue
+            # 🔁 Anti-spam: skip if same URL already sent
+            if last_url == link:
+                continue
 
-        await context.bot.send_message(
-            chat_id=user_id,
-            text=(
+            delivered = await delivery.send(
+                context.bot, db, user_id,
                 "🔥 New jobs matching your profile\n\n"
                 f"🔍 Role: {skills}\n"
                 f"📍 Location: {location or 'Any'}\n"
@@ -492,14 +403,10 @@ async def daily_jobs(context: ContextTypes.DEFAULT_TYPE):
                 f"👉 {link}\n\n"
                 "Tip: Apply to 3–5 jobs today"
             )
-        )
 
-        # ✅ Save last sent job URL (anti-spam)
-        cursor.execute(
-            "UPDATE user_skills SET last_job_url = ? WHERE user_id = ?",
-            (link, user_id)
-        )
-        conn.commit()
+            # ✅ Save last sent job URL (anti-spam)
+            if delivered:
+                await db.set_last_job_url(user_id, link)
 
 async def update_skill(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not context.args:
@@ -513,13 +420,7 @@ async def update_skill(update: Update, context: ContextTypes.DEFAULT_TYPE):
     skills = ", ".join(skills_list)
     user_id = update.effective_user.id
 
-    cursor.execute(
-        "UPDATE user_skills SET skills = ? WHERE user_id = ?",
-        (skills, user_id)
-    )
-    conn.commit()
-
-    if cursor.rowcount == 0:
+    if not await db.update_skills(user_id, skills):
         await update.message.reply_text(
             "❌ No existing skills found.\nUse /skills first."
         )
@@ -529,42 +430,33 @@ async def update_skill(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"🔄 Skills updated:\n✅ {skills}"
     )
 
-# async def weekly_summary(context: ContextTypes.DEFAULT_TYPE):
-#     one_week_ago = datetime.now(timezone.utc) - timedelta(days=7)
+async def weekly_summary(context: ContextTypes.DEFAULT_TYPE, partition=None):
+    # Reads the precomputed weekly_activity rollup for last week (Mon-Sun)
+    today = datetime.now(timezone.utc).date()
+    week = today - timedelta(days=today.weekday() + 7)
 
-#     cursor.execute("""
-#         SELECT user_id, action, COUNT(*)
-#         FROM job_actions
-#         WHERE action_at >= ?
-#         GROUP BY user_id, action
-#     """, (one_week_ago.isoformat(),))
+    rows = await db.weekly_activity(week.isoformat(), partition)
 
-#     rows = cursor.fetchall()
+    summary = {}
 
-#     summary = {}
+    for user_id, action, count in rows:
+        summary.setdefault(user_id, {"apply": 0, "follow": 0, "ignore": 0})
+        summary[user_id][action] = count
 
-#     for user_id, action, count in rows:
-#         summary.setdefault(user_id, {"apply": 0, "follow": 0, "ignore": 0})
-#         summary[user_id][action] += count
-
-#     for user_id, data in summary.items():
-#         msg = (
-#             "📊 Weekly Job Summary\n\n"
-#             f"✅ Applied: {data['apply']}\n"
-#             f"🔔 Followed up: {data['follow']}\n"
-#             f"❌ Ignored: {data['ignore']}"
-#         )
+    for user_id, data in summary.items():
+        msg = (
+            "📊 Weekly Job Summary\n\n"
+            f"✅ Applied: {data['apply']}\n"
+            f"🔔 Followed up: {data['follow']}\n"
+            f"❌ Ignored: {data['ignore']}"
+        )
 
-#         await context.bot.send_message(chat_id=user_id, text=msg)
+        await delivery.send(context.bot, db, user_id, msg)
 
 async def stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
-    cursor.execute(
-        "UPDATE user_skills SET active = 0 WHERE user_id = ?",
-        (user_id,)
-    )
-    conn.commit()
+    await db.set_active(user_id, False)
 
     await update.message.reply_text(
         "⛔ Job notifications stopped.\n"
@@ -600,12 +492,16 @@ async def preferences(update: Update, context: ContextTypes.DEFAULT_TYPE):
             exp_min = exp
             exp_max = exp
 
-    if exp_min and not exp_min.isdigit():
+    if (exp_min and not exp_min.isdigit()) or (exp_max and not exp_max.isdigit()):
         await update.message.reply_text(
             "❌ Invalid experience.\nUse format: exp=4 or exp=4-6"
         )
         return
 
+    # Stored as integers so every backend gets the same type
+    exp_min = int(exp_min) if exp_min else None
+    exp_max = int(exp_max) if exp_max else None
+
     if mode:
         if mode in ["remote"]:
             mode = "remote"
@@ -620,14 +516,7 @@ async def preferences(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
 
-    cursor.execute("""
-        UPDATE user_skills
-        SET location = ?, exp_min = ?, exp_max = ?, work_mode = ?
-        WHERE user_id = ?
-    """, (location, exp_min, exp_max, mode, user_id))
-    conn.commit()
-
-    if cursor.rowcount == 0:
+    if not await db.set_preferences(user_id, location, exp_min, exp_max, mode):
         await update.message.reply_text(
             "❌ No profile found.\nUse /skills first."
         )
@@ -654,11 +543,7 @@ async def remove_applied(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Remove all
     if context.args[0].lower() == "all":
-        cursor.execute(
-            "DELETE FROM applied_jobs WHERE user_id = ?",
-            (user_id,)
-        )
-        conn.commit()
+        await db.remove_all_applied(user_id)
 
         await update.message.reply_text("🗑️ All reminders removed")
         return
@@ -666,18 +551,12 @@ async def remove_applied(update: Update, context: ContextTypes.DEFAULT_TYPE):
     company = context.args[0]
     role = " ".join(context.args[1:])
 
-    cursor.execute("""
-        DELETE FROM applied_jobs
-        WHERE user_id = ?
-          AND LOWER(company) = LOWER(?)
-          AND LOWER(role) = LOWER(?)
-    """, (user_id, company, role))
-    conn.commit()
+    removed = await db.remove_applied(user_id, company, role)
 
-    if cursor.rowcount == 0:
+    if removed == 0:
         await update.message.reply_text(
             "⚠️ No matching reminder found.\n"
-            "Tip: use /list_applied to see exact names."
+            "Tip: use /search or /list_applied to see exact names."
         )
     else:
         await update.message.reply_text(
@@ -687,13 +566,7 @@ async def remove_applied(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def list_applied(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
-    cursor.execute("""
-        SELECT company, role, followup_after, link
-        FROM applied_jobs
-        WHERE user_id = ?
-        ORDER BY applied_at DESC
-    """, (user_id,))
-    rows = cursor.fetchall()
+    rows = await db.list_applied(user_id)
 
     if not rows:
         await update.message.reply_text(
@@ -702,7 +575,7 @@ async def list_applied(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     msg = "📄 Your applied jobs:\n\n"
-    for idx, (company, role, days, link) in enumerate(rows, start=1):
+    for idx, (company, role, _, days, link) in enumerate(rows, start=1):
         msg += (
             f"{idx}️⃣ {company} – {role}\n"
             f"⏰ Follow-up after {days} day(s)\n"
@@ -713,47 +586,150 @@ async def list_applied(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     await update.message.reply_text(msg)
 
-async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def search_applied(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /search <words> [page=N] – prefix match on company, role and link
+    page = 1
+    words = []
+    for arg in context.args:
+        if arg.lower().startswith("page=") and arg[5:].isdigit():
+            page = max(int(arg[5:]), 1)
+        else:
+            words.append(arg)
+    query = " ".join(words)
+
+    if not search_terms(query):
+        await update.message.reply_text(
+            "❌ Usage:\n"
+            "/search <company / role / link words> [page=2]\n"
+            "Example: /search amaz devops"
+        )
+        return
+
     user_id = update.effective_user.id
+    offset = (page - 1) * SEARCH_PAGE_SIZE
 
-    cursor.execute("""
-        SELECT skills, location, exp_min, exp_max, work_mode, active
-        FROM user_skills
-        WHERE user_id = ?
-    """, (user_id,))
-    row = cursor.fetchone()
+    # One extra row tells us whether there is a next page
+    rows = await db.search_applied(user_id, query, SEARCH_PAGE_SIZE + 1, offset)
+    has_more = len(rows) > SEARCH_PAGE_SIZE
+    rows = rows[:SEARCH_PAGE_SIZE]
 
-    if not row:
+    if not rows:
         await update.message.reply_text(
-            "❌ No profile found.\nUse /start and /skills first."
+            f"🔍 No applied jobs match \"{query}\"" if page == 1
+            else f"🔍 No more matches for \"{query}\""
+        )
+        return
+
+    msg = f"🔍 Matches for \"{query}\" (page {page}):\n\n"
+    for idx, (company, role, _, days, link) in enumerate(rows, start=offset + 1):
+        msg += (
+            f"{idx}. {company} – {role}\n"
+            f"⏰ Follow-up after {days} day(s)\n"
+        )
+        if link:
+            msg += f"🔗 {link}\n"
+        msg += "\n"
+
+    if has_more:
+        msg += f"➡️ More: /search {query} page={page + 1}"
+
+    await update.message.reply_text(msg)
+
+async def import_applied(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Any uploaded document: CSV (header row) or JSON / JSON Lines with
+    # company, role and optional applied_at, followup_after, link
+    document = update.message.document
+    fmt = bulk.format_for(document.file_name)
+
+    if not fmt:
+        await update.message.reply_text(
+            "❌ Send a .csv, .json or .jsonl file with columns:\n"
+            "company, role, applied_at, followup_after, link"
+        )
+        return
+
+    if document.file_size and document.file_size > bulk.IMPORT_MAX_BYTES:
+        await update.message.reply_text(
+            f"❌ File too large (max {bulk.IMPORT_MAX_BYTES // 1024} KB)"
         )
         return
 
-    skills, location, exp_min, exp_max, work_mode, active = row
+    user_id = update.effective_user.id
+    report = bulk.ImportReport()
+
+    tg_file = await document.get_file()
+    with tempfile.TemporaryFile() as tmp:
+        await tg_file.download_to_memory(out=tmp)
+        tmp.seek(0)
+
+        # Rows are parsed as the storage layer consumes them: one
+        # transaction, executemany per batch
+        try:
+            added, updated = await db.import_applied(
+                user_id, bulk.parse(tmp, fmt, report), bulk.BULK_BATCH
+            )
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            await update.message.reply_text(f"❌ Could not read file: {e}")
+            return
 
-    cursor.execute(
-        "SELECT COUNT(*) FROM applied_jobs WHERE user_id = ?",
-        (user_id,)
+    msg = (
+        f"📥 Imported {added + updated} job(s)\n"
+        f"✅ New: {added}\n"
+        f"🔄 Updated: {updated}"
     )
-    applied_count = cursor.fetchone()[0]
+    if report.skipped_count:
+        msg += f"\n\n⚠️ Skipped {report.skipped_count} row(s):\n" + "\n".join(
+            f"#{where}: {reason}" for where, reason in report.skipped
+        )
+    if report.truncated:
+        msg += f"\n\n✂️ Stopped at {bulk.IMPORT_MAX_ROWS} rows"
 
-    now = datetime.now(timezone.utc)
-    due_count = 0
+    await update.message.reply_text(msg)
+
+async def export_applied(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    fmt = context.args[0].lower() if context.args else "csv"
+    fmt = {"json": "jsonl"}.get(fmt, fmt)
+
+    if fmt not in ("csv", "jsonl"):
+        await update.message.reply_text("❌ Usage:\n/export_applied [csv|json]")
+        return
+
+    user_id = update.effective_user.id
+
+    with tempfile.TemporaryFile() as tmp:
+        count = await bulk.export(
+            db.export_applied(user_id, bulk.BULK_BATCH), tmp, fmt
+        )
 
-    cursor.execute("""
-        SELECT applied_at, followup_after
-        FROM applied_jobs
-        WHERE user_id = ?
-    """, (user_id,))
-    rows = cursor.fetchall()
+        if not count:
+            await update.message.reply_text(
+                "📭 You have not added any applied jobs yet"
+            )
+            return
 
-    for applied_at, days in rows:
-        t = datetime.fromisoformat(applied_at)
-        if t.tzinfo is None:
-            t = t.replace(tzinfo=timezone.utc)
-        if now - t >= timedelta(days=days):
-            due_count += 1
+        tmp.seek(0)
+        await update.message.reply_document(
+            document=tmp,
+            filename=f"applied_jobs.{fmt}",
+            caption=f"📤 {count} applied job(s). Send this file back to re-import."
+        )
 
+async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+
+    # Profile, rollup counter and due count in one read
+    status = await db.get_status(
+        user_id, datetime.now(timezone.utc).isoformat()
+    )
+
+    if not status:
+        await update.message.reply_text(
+            "❌ No profile found.\nUse /start and /skills first."
+        )
+        return
+
+    profile, applied_count, due_count = status
+    _, skills, location, exp_min, exp_max, work_mode, _, active = profile
 
     await update.message.reply_text(
         "📊 Your Job Bot Status\n\n"
@@ -766,84 +742,168 @@ async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"⏰ Follow-ups due today: {due_count}"
     )
 
-async def send_alert(context, message: str):
+async def profile_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Admin only: sample the live process for N seconds
+    if update.effective_chat.id != ADMIN_CHAT_ID:
+        return
+
+    import profiler  # rarely used; kept off the start-up path
+
     try:
-        await context.bot.send_message(
-            chat_id=ADMIN_CHAT_ID,
-            text=f"🚨 *BOT ALERT*\n\n{message}",
-            parse_mode="Markdown"
+        seconds = int(context.args[0]) if context.args else 30
+    except ValueError:
+        seconds = 0
+    if not 1 <= seconds <= profiler.PROFILE_MAX_SECONDS:
+        await update.message.reply_text(
+            f"❌ Usage:\n/profile [seconds], 1–{profiler.PROFILE_MAX_SECONDS}"
         )
-    except Exception as e:
-        logging.error(f"Failed to send alert: {e}")
+        return
+
+    if profiler.busy():
+        await update.message.reply_text("⏳ A profile is already running.")
+        return
+
+    await update.message.reply_text(f"🔬 Profiling for {seconds}s...")
+
+    sampler = await profiler.profile(seconds)
+
+    await update.message.reply_text(profiler.report(sampler, seconds)[:4000])
+    await update.message.reply_document(
+        document=sampler.collapsed().encode(),
+        filename=f"profile-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}.folded",
+        caption="🔥 Collapsed stacks (flamegraph.pl / speedscope)"
+    )
+
+async def alert_digest(context):
+    await alerter.flush(context.bot)
 
 async def bot_heartbeat(context):
     try:
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS bot_health (
-                id INTEGER PRIMARY KEY,
-                last_heartbeat TEXT
-            )
-        """)
-
         now = datetime.now(timezone.utc).isoformat()
 
-        cursor.execute("""
-            INSERT INTO bot_health (id, last_heartbeat)
-            VALUES (1, ?)
-            ON CONFLICT(id) DO UPDATE SET last_heartbeat = excluded.last_heartbeat
-        """, (now,))
-        conn.commit()
+        await db.record_heartbeat(now)
+        await leader.renew()
 
         logging.info("Bot heartbeat OK")
 
     except Exception as e:
         logging.error("Heartbeat failed", exc_info=True)
-        await send_alert(context, f"Heartbeat failed:\n{e}")
+        await alerter.alert(
+            context.bot, "heartbeat", f"Heartbeat failed:\n{e}"
+        )
 
+@lifecycle.coordinator.tracked
 async def monitored_daily_jobs(context):
     try:
-        logging.info("Daily jobs started")
-        await daily_jobs(context)
-        logging.info("Daily jobs finished")
+        with tracing.span("job daily_jobs", root=True,
+                          rate=tracing.TRACE_JOB_SAMPLE_RATE):
+            logging.info("Daily jobs started")
+            await cluster.run_partitioned(
+                db, leader, f"daily_jobs:{datetime.now(IST):%Y-%m-%dT%H}",
+                lambda partition: daily_jobs(context, partition),
+                workers=db.shard_count
+            )
+            logging.info("Daily jobs finished")
     except Exception as e:
         logging.error("Daily jobs failed", exc_info=True)
-        await send_alert(context, f"Daily jobs failed:\n{e}")
+        await alerter.alert(
+            context.bot, "daily_jobs", f"Daily jobs failed:\n{e}"
+        )
 
+@lifecycle.coordinator.tracked
 async def monitored_daily_followup(context):
     try:
-        logging.info("Daily followups started")
-        await daily_followup(context)
-        logging.info("Daily followups finished")
+        with tracing.span("job daily_followup", root=True,
+                          rate=tracing.TRACE_JOB_SAMPLE_RATE):
+            logging.info("Daily followups started")
+            await cluster.run_partitioned(
+                db, leader, f"daily_followup:{datetime.now(IST):%Y-%m-%dT%H}",
+                lambda partition: daily_followup(context, partition),
+                workers=db.shard_count
+            )
+            logging.info("Daily followups finished")
     except Exception as e:
         logging.error("Daily followups failed", exc_info=True)
-        await send_alert(context, f"Daily followups failed:\n{e}")
+        await alerter.alert(
+            context.bot, "daily_followup", f"Daily followups failed:\n{e}"
+        )
 
-async def startup_marker(context):
-    logging.info("Bot startup recorded")
+@lifecycle.coordinator.tracked
+async def monitored_weekly_summary(context):
     try:
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS crash_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                occurred_at TEXT
+        with tracing.span("job weekly_summary", root=True,
+                          rate=tracing.TRACE_JOB_SAMPLE_RATE):
+            logging.info("Weekly summary started")
+            await cluster.run_partitioned(
+                db, leader, f"weekly_summary:{datetime.now(IST):%Y-%m-%d}",
+                lambda partition: weekly_summary(context, partition),
+                workers=db.shard_count
             )
-        """)
+            logging.info("Weekly summary finished")
+    except Exception as e:
+        logging.error("Weekly summary failed", exc_info=True)
+        await alerter.alert(
+            context.bot, "weekly_summary", f"Weekly summary failed:\n{e}",
+            alerts.WARNING
+        )
 
-        cursor.execute(
-            "INSERT INTO crash_log (occurred_at) VALUES (?)",
-            (datetime.now(timezone.utc).isoformat(),)
+# run_id prefix -> partition handler, for runs resumed after a restart
+RUN_HANDLERS = {
+    "daily_jobs": daily_jobs,
+    "daily_followup": daily_followup,
+    "weekly_summary": weekly_summary,
+}
+
+@lifecycle.coordinator.tracked
+async def resume_runs(context):
+    # A deploy or crash during a broadcast leaves buckets unfinished, and
+    # with a single replica nobody else picks them up. Today's runs are
+    # resumed here; finished buckets are not sent again.
+    try:
+        today = datetime.now(IST).replace(hour=0, minute=0, second=0, microsecond=0)
+        for run_id, partitions in await db.unfinished_runs(today.timestamp()):
+            handler = RUN_HANDLERS.get(run_id.split(":", 1)[0])
+            if handler is None:
+                continue
+            logging.info(f"Resuming {run_id}")
+            await cluster.run_partitioned(
+                db, leader, run_id,
+                lambda partition, handler=handler: handler(context, partition),
+                partitions=partitions, workers=db.shard_count
+            )
+    except Exception as e:
+        logging.error("Resuming runs failed", exc_info=True)
+        await alerter.alert(
+            context.bot, "resume_runs", f"Resuming broadcasts failed:\n{e}"
         )
-        conn.commit()
 
-        cursor.execute("""
-            SELECT COUNT(*) FROM crash_log
-            WHERE occurred_at >= datetime('now', '-10 minutes')
-        """)
-        crashes = cursor.fetchone()[0]
+@lifecycle.coordinator.tracked
+async def backup_job(context):
+    try:
+        for name, conn in db.snapshot_targets().items():
+            await backup.snapshot(conn, name)
+    except Exception as e:
+        logging.error("Backup failed", exc_info=True)
+        await alerter.alert(
+            context.bot, "backup", f"Backup failed:\n{e}", alerts.WARNING
+        )
+
+async def startup_marker(context):
+    logging.info("Bot startup recorded")
+    try:
+        now = datetime.now(timezone.utc)
+
+        await db.record_startup(now.isoformat())
+
+        crashes = await db.count_startups_since(
+            (now - timedelta(minutes=10)).isoformat()
+        )
 
         if crashes >= 3:
-            await send_alert(
-                context,
-                f"Bot restarted {crashes} times in last 10 minutes"
+            await alerter.alert(
+                context.bot, "crash_loop",
+                f"Bot restarted {crashes} times in last 10 minutes",
+                alerts.CRITICAL
             )
 
     except Exception as e:
@@ -881,10 +941,14 @@ async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/applied Amazon DevOps Engineer days=7 link=https://job-link\n\n"
 
         "5️⃣ View applied jobs:\n"
-        "/list_applied\n\n"
+        "/list_applied\n"
+        "/search amazon devops – Find one by company, role or link\n"
+        "/export_applied – Download them as CSV (or /export_applied json)\n"
+        "📎 Send a CSV/JSON file to add many at once\n\n"
 
         "6️⃣ Check follow-ups:\n"
-        "/followups\n\n"
+        "/followups\n"
+        "/followupmsg (message template)\n\n"
 
         "7️⃣ Remove reminder if needed:\n"
         "/remove_applied Amazon DevOps Engineer\n"
@@ -902,6 +966,7 @@ async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     )
 
+@tracing.instrument()
 def build_naukri_url(role, location=None, exp_min=None, work_mode=None):
     base = "https://www.naukri.com"
     role_slug = role.lower().replace(" ", "-")
@@ -934,28 +999,93 @@ def build_naukri_url(role, location=None, exp_min=None, work_mode=None):
 # ==========================
 # MAIN APP
 # ==========================
+async def post_init(app):
+    # Pools need a running loop, so storage is opened here rather than at import
+    startup.mark("initialize")
+    lifecycle.coordinator.install(app)
+    await db.connect()
+    await leader.renew()
+    # Readiness flips on the first successful poll (lifecycle.PollRequest)
+    startup.mark("post_init")
+
+async def post_stop(app):
+    # Bot is still usable here (not in post_shutdown): send held alerts
+    await alerter.flush(app.bot)
+
+async def post_shutdown(app):
+    # Hand the lease over now instead of waiting for it to expire
+    await leader.release()
+    await db.close()
+    tracing.shutdown()
+
+async def run_scheduler_only(app):
+    # What run_polling does, minus the updater: hooks, then the job queue
+    # until the coordinator has drained
+    await app.initialize()
+    try:
+        await post_init(app)
+        await app.start()
+        # Nothing to poll, so the replica serves as soon as jobs can run
+        lifecycle.coordinator.set_ready(True)
+        startup.finish("scheduler_start")
+        await lifecycle.coordinator.drained.wait()
+        await app.stop()
+        await post_stop(app)
+    finally:
+        await app.shutdown()
+        await post_shutdown(app)
+
+def update_handler(callback):
+    # Root span, in-flight tracking for shutdown, per-user rate limit
+    return tracing.traced(lifecycle.coordinator.tracked(guarded(callback)))
+
 def main():
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    # Probes and /metrics answer while the rest starts (/ready stays 503)
+    start_metrics_server()  # starts /metrics on :8000
+    lifecycle.start_health_server()  # /healthz and /ready on :8001
+
+    builder = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        # Handlers no longer share a cursor, so one user's slow command
+        # doesn't hold up everyone else's
+        .concurrent_updates(True)
+        # Spans per Bot API call; pool size as the builder's default
+        .request(tracing.TracedRequest(connection_pool_size=256))
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+    )
+    if BOT_POLLING:
+        builder = builder.get_updates_request(lifecycle.PollRequest())
+    else:
+        builder = builder.updater(None)
+    app = builder.build()
 
     # ------------------
     # Command handlers
     # ------------------
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(CommandHandler("skills", set_skills))
-    app.add_handler(CommandHandler("update_skill", update_skill))
-    app.add_handler(CommandHandler("my_skills", my_skills))
-    app.add_handler(CommandHandler("preferences", preferences))
-    app.add_handler(CommandHandler("jobs", jobs))
-    app.add_handler(CommandHandler("refresh_jobs", refresh_jobs))
-    app.add_handler(CommandHandler("applied", applied))
-    app.add_handler(CommandHandler("followups", followups))
-    app.add_handler(CommandHandler("remove_applied", remove_applied))
-    app.add_handler(CommandHandler("list_applied", list_applied))
-    app.add_handler(CommandHandler("stop", stop))
-    app.add_handler(CommandHandler("help", help_cmd))
-    app.add_handler(CommandHandler("hep", help_cmd))
-    app.add_handler(CommandHandler("status", status))
-    app.add_handler(CommandHandler("any_new_opening", any_new_opening))
+    app.add_handler(CommandHandler("start", update_handler(start)))
+    app.add_handler(CommandHandler("skills", update_handler(set_skills)))
+    app.add_handler(CommandHandler("update_skill", update_handler(update_skill)))
+    app.add_handler(CommandHandler("my_skills", update_handler(my_skills)))
+    app.add_handler(CommandHandler("preferences", update_handler(preferences)))
+    app.add_handler(CommandHandler("jobs", update_handler(jobs)))
+    app.add_handler(CommandHandler("refresh_jobs", update_handler(refresh_jobs)))
+    app.add_handler(CommandHandler("applied", update_handler(applied)))
+    app.add_handler(CommandHandler("followups", update_handler(followups)))
+    app.add_handler(CommandHandler("followupmsg", update_handler(followupmsg)))
+    app.add_handler(CommandHandler("remove_applied", update_handler(remove_applied)))
+    app.add_handler(CommandHandler("list_applied", update_handler(list_applied)))
+    app.add_handler(CommandHandler("search", update_handler(search_applied)))
+    app.add_handler(CommandHandler("export_applied", update_handler(export_applied)))
+    app.add_handler(MessageHandler(filters.Document.ALL, update_handler(import_applied)))
+    app.add_handler(CommandHandler("stop", update_handler(stop)))
+    app.add_handler(CommandHandler("help", update_handler(help_cmd)))
+    app.add_handler(CommandHandler("hep", update_handler(help_cmd)))
+    app.add_handler(CommandHandler("status", update_handler(status)))
+    app.add_handler(CommandHandler("any_new_opening", update_handler(any_new_opening)))
+    app.add_handler(CommandHandler("profile", update_handler(profile_cmd)))
 
     # Heartbeat every 5 minutes
     app.job_queue.run_repeating(bot_heartbeat, interval=300, first=60)
@@ -963,6 +1093,20 @@ def main():
     # Crash detector on startup
     app.job_queue.run_once(startup_marker, when=5)
 
+    # Finish broadcasts interrupted by the previous shutdown
+    app.job_queue.run_once(resume_runs, when=10)
+
+    # Admin alert digests
+    app.job_queue.run_repeating(
+        alert_digest, interval=alerts.ALERT_DIGEST_INTERVAL,
+        first=alerts.ALERT_DIGEST_INTERVAL
+    )
+
+    # Online DB snapshots
+    app.job_queue.run_repeating(
+        backup_job, interval=backup.BACKUP_INTERVAL, first=120
+    )
+
 
     # Replace daily_jobs with monitored version
     # Jobs
@@ -973,17 +1117,28 @@ def main():
     app.job_queue.run_daily(monitored_daily_followup, time=time(hour=9, minute=30, tzinfo=IST))
     app.job_queue.run_daily(monitored_daily_followup, time=time(hour=14, minute=30, tzinfo=IST))
 
+    # Weekly summary, Monday morning (job_queue days: 0 = Sunday)
+    app.job_queue.run_daily(
+        monitored_weekly_summary, time=time(hour=10, tzinfo=IST), days=(1,)
+    )
+
     # app.job_queue.run_daily(daily_jobs, time=time(hour=9, tzinfo=IST))
     # app.job_queue.run_daily(daily_jobs, time=time(hour=14, tzinfo=IST))
     # app.job_queue.run_daily(daily_followup, time=time(hour=9, minute=30, tzinfo=IST))
     # app.job_queue.run_daily(daily_followup, time=time(hour=14, minute=30, tzinfo=IST))
 
-    start_metrics_server()  # starts /metrics on :8000
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, update_handler(handle_message)))
     
+    startup.mark("app_build")
     logging.info("🤖 Job Seeker Bot running")
 
-    app.run_polling(stop_signals=None)
+    # SIGTERM/SIGINT are handled by lifecycle.coordinator, which drains
+    # in-flight work before letting run_polling return
+    if BOT_POLLING:
+        app.run_polling(stop_signals=None)
+    else:
+        logging.info("BOT_POLLING=0: scheduler and broadcast partitions only")
+        asyncio.run(run_scheduler_only(app))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,157 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime, timezone
+
+# ==========================
+# CONFIG
+# ==========================
+
+# Telegram lets bots download up to 20 MB; applied-job lists are far smaller
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(2 * 1024 * 1024)))
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "5000"))
+
+# Accepted followup_after range (days); anything else skips the row
+FOLLOWUP_MAX_DAYS = int(os.getenv("FOLLOWUP_MAX_DAYS", "365"))
+
+# Rows per executemany / fetchmany round
+BULK_BATCH = int(os.getenv("BULK_BATCH", "500"))
+
+# Column order for both import and export, so an export re-imports as is
+FIELDS = ("company", "role", "applied_at", "followup_after", "link")
+
+FORMATS = {".csv": "csv", ".json": "json", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+# ==========================
+# IMPORT
+# ==========================
+
+class ImportReport:
+
+    def __init__(self):
+        self.rows = 0
+        self.skipped = []  # (line or index, reason), first few only
+        self.skipped_count = 0
+        self.truncated = False
+
+    def skip(self, where, reason):
+        self.skipped_count += 1
+        if len(self.skipped) < 5:
+            self.skipped.append((where, reason))
+
+def format_for(filename):
+    return FORMATS.get(os.path.splitext(filename or "")[1].lower())
+
+def _applied_at(value):
+    if not value:
+        return datetime.now(timezone.utc).isoformat()
+    t = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    return t.astimezone(timezone.utc).isoformat()
+
+def _followup_after(record):
+    days = record.get("followup_after")
+    if days is None:
+        days = record.get("days")
+    # Missing or blank (empty CSV cell) means the default; 0 is kept
+    if days is None or (isinstance(days, str) and not days.strip()):
+        return 5
+
+    if isinstance(days, float) and days.is_integer():
+        days = int(days)
+    if isinstance(days, bool) or not isinstance(days, (int, str)):
+        raise ValueError("followup_after must be a whole number")
+    try:
+        days = int(days)
+    except ValueError:
+        raise ValueError("followup_after must be a whole number")
+
+    if not 0 <= days <= FOLLOWUP_MAX_DAYS:
+        raise ValueError(f"followup_after must be 0-{FOLLOWUP_MAX_DAYS}")
+    return days
+
+def _row(record):
+    # One CSV/JSON record -> (company, role, applied_at, followup_after, link)
+    if not isinstance(record, dict):
+        raise ValueError("not an object")
+
+    company = str(record.get("company") or "").strip()
+    role = str(record.get("role") or "").strip()
+    if not company or not role:
+        raise ValueError("company and role are required")
+
+    days = _followup_after(record)
+
+    try:
+        applied_at = _applied_at(record.get("applied_at"))
+    except ValueError:
+        raise ValueError("applied_at must be an ISO date")
+
+    link = str(record.get("link") or "").strip() or None
+    return company, role, applied_at, days, link
+
+def _records(stream, fmt):
+    # -> (where, record) pairs, read incrementally for csv/jsonl
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, {
+                (k or "").strip().lower(): v for k, v in record.items()
+            }
+    elif fmt == "jsonl":
+        for line_num, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    yield line_num, json.loads(line)
+                except ValueError:
+                    yield line_num, None
+    else:
+        # A JSON array has to be parsed whole; IMPORT_MAX_BYTES bounds it
+        data = json.load(stream)
+        if not isinstance(data, list):
+            raise ValueError("expected a JSON array of objects")
+        yield from enumerate(data, 1)
+
+def parse(binary, fmt, report):
+    # Lazily yields valid rows from an uploaded file; bad rows are
+    # skipped and noted in `report`
+    stream = io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+    for where, record in _records(stream, fmt):
+        if report.rows >= IMPORT_MAX_ROWS:
+            report.truncated = True
+            return
+        try:
+            row = _row(record)
+        except ValueError as e:
+            report.skip(where, str(e))
+            continue
+        report.rows += 1
+        yield row
+
+# ==========================
+# EXPORT
+# ==========================
+
+async def export(batches, out, fmt):
+    # Writes (company, role, applied_at, followup_after, link) batches as
+    # they arrive; returns the number of rows written
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    count = 0
+
+    if fmt == "csv":
+        writer = csv.writer(text)
+        writer.writerow(FIELDS)
+        async for batch in batches:
+            writer.writerows(batch)
+            count += len(batch)
+    else:
+        async for batch in batches:
+            for row in batch:
+                text.write(json.dumps(dict(zip(FIELDS, row))) + "\n")
+            count += len(batch)
+
+    text.flush()
+    text.detach()
+    return count
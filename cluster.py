@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from lifecycle import coordinator
+from metrics import PARTITIONS_PROCESSED, SCHEDULER_LEADER
+
+# ==========================
+# CONFIG
+# ==========================
+
+# Pod name in k8s (downward API); falls back to host + pid for docker runs
+NODE_ID = os.getenv("NODE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+# Renewed by the 5-minute heartbeat, so a leader survives two missed beats
+LEASE_TTL = int(os.getenv("LEASE_TTL", "900"))
+
+# user_id buckets per broadcast run; any replica can claim any bucket
+WORK_PARTITIONS = int(os.getenv("WORK_PARTITIONS", "8"))
+
+# A claimed bucket not renewed within this window is handed to someone else;
+# the owner renews it every CLAIM_TIMEOUT / 3 while it is still working
+CLAIM_TIMEOUT = int(os.getenv("CLAIM_TIMEOUT", "600"))
+
+# How often a replica with nothing to claim re-checks a run whose remaining
+# buckets are held by others (they may finish, or go stale and be reclaimed)
+CLAIM_POLL_INTERVAL = float(os.getenv("CLAIM_POLL_INTERVAL", "15"))
+
+# Followers give the leader this long to create the run's buckets first
+FOLLOWER_DELAY = float(os.getenv("FOLLOWER_DELAY", "5"))
+
+# ==========================
+# LEADER ELECTION
+# ==========================
+
+class LeaderElection:
+
+    def __init__(self, db, name="scheduler", holder=NODE_ID, ttl=LEASE_TTL):
+        self.db = db
+        self.name = name
+        self.holder = holder
+        self.ttl = ttl
+        self.is_leader = False
+
+    async def renew(self):
+        was_leader = self.is_leader
+        try:
+            self.is_leader = await self.db.acquire_lease(
+                self.name, self.holder, self.ttl, time.time()
+            )
+        except Exception:
+            # Can't prove we still hold it, so stop acting as leader
+            self.is_leader = False
+            raise
+        finally:
+            SCHEDULER_LEADER.set(1 if self.is_leader else 0)
+
+        if self.is_leader != was_leader:
+            logging.info(
+                f"Scheduler leadership {'acquired' if self.is_leader else 'lost'} "
+                f"by {self.holder}"
+            )
+        return self.is_leader
+
+    async def release(self):
+        if self.is_leader:
+            await self.db.release_lease(self.name, self.holder)
+            self.is_leader = False
+            SCHEDULER_LEADER.set(0)
+
+# ==========================
+# PARTITIONED RUNS
+# ==========================
+
+async def _keep_claim(db, holder, run_id, part):
+    # A slow but healthy bucket must not look abandoned
+    while True:
+        await asyncio.sleep(CLAIM_TIMEOUT / 3)
+        try:
+            if not await db.renew_claim(run_id, part, holder, time.time()):
+                logging.warning(f"{run_id}: partition {part} was taken over")
+                return
+        except Exception:
+            logging.warning(f"{run_id}: renewing partition {part} failed", exc_info=True)
+
+async def _process(db, holder, run_id, part, partitions, handler):
+    keepalive = asyncio.create_task(_keep_claim(db, holder, run_id, part))
+    try:
+        await handler((part, partitions))
+    except BaseException:
+        # Cancelled by shutdown or failed: hand it back right away rather
+        # than after CLAIM_TIMEOUT
+        await db.release_partition(run_id, part, holder)
+        raise
+    finally:
+        keepalive.cancel()
+    await db.complete_partition(run_id, part, holder)
+
+async def run_partitioned(db, leader, run_id, handler,
+                          partitions=WORK_PARTITIONS, workers=1):
+    # Every replica seeds the run's buckets (idempotent), then claims them
+    # until none are left. `handler` gets the (index, count) partition to
+    # process; `workers` buckets are processed concurrently here. Returns
+    # the buckets done by this replica.
+
+    # Re-check the lease now: a replica that just stopped released it, and
+    # waiting for the next heartbeat would leave this run without a leader
+    await leader.renew()
+
+    if not leader.is_leader:
+        await asyncio.sleep(FOLLOWER_DELAY)
+    # Not left to the leader alone: a crashed or rescheduled pod keeps the
+    # lease for up to LEASE_TTL, and the run must not depend on it
+    await db.create_work_partitions(run_id, partitions, time.time())
+
+    async def worker():
+        processed = 0
+        # A shutting-down replica claims no more buckets; what's left is
+        # picked up by the other replicas, or by resume on the next start
+        while not coordinator.stopping:
+            now = time.time()
+            part = await db.claim_partition(
+                run_id, leader.holder, now, now - CLAIM_TIMEOUT
+            )
+            if part is None:
+                # Nothing claimable. Done once every bucket is; otherwise
+                # the rest are held by others: wait until they finish or
+                # their claims go stale
+                if not await db.unfinished_partitions(run_id):
+                    return processed
+                await asyncio.sleep(CLAIM_POLL_INTERVAL)
+                continue
+
+            await _process(db, leader.holder, run_id, part, partitions, handler)
+
+            PARTITIONS_PROCESSED.labels(run=run_id.split(":", 1)[0]).inc()
+            processed += 1
+
+        return processed
+
+    processed = sum(await asyncio.gather(*(worker() for _ in range(workers))))
+
+    logging.info(f"{run_id}: {processed} partition(s) processed by {leader.holder}")
+    return processed
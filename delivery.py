@@ -0,0 +1,68 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from metrics import DELIVERY_OUTCOMES
+
+# ==========================
+# CLASSIFICATION
+# ==========================
+
+# Outcomes that will never succeed on retry; the user is taken out of
+# broadcasts until they /start again
+PERMANENT = {"blocked", "chat_not_found", "deactivated"}
+
+def classify(error):
+    text = str(error).lower()
+
+    if isinstance(error, Forbidden):
+        if "deactivated" in text:
+            return "deactivated"
+        return "blocked"
+
+    if isinstance(error, BadRequest):
+        # BadRequest subclasses NetworkError, but retrying won't fix it
+        if "chat not found" in text:
+            return "chat_not_found"
+        return "error"
+
+    if isinstance(error, (RetryAfter, NetworkError)):
+        return "transient"
+
+    return "error"
+
+# ==========================
+# SEND
+# ==========================
+
+async def send(bot, db, user_id, text, **kwargs):
+    # Broadcast send that never raises: returns True if delivered.
+    # A flood-control reply is honoured once; permanent failures mark
+    # the user unreachable so the next run's query skips them.
+    for attempt in range(2):
+        try:
+            await bot.send_message(chat_id=user_id, text=text, **kwargs)
+            DELIVERY_OUTCOMES.labels(outcome="ok").inc()
+            return True
+
+        except RetryAfter as e:
+            if attempt:
+                outcome = "transient"
+                break
+            await asyncio.sleep(e.retry_after)
+
+        except Exception as e:
+            outcome = classify(e)
+            if outcome in PERMANENT:
+                await db.mark_unreachable(
+                    user_id, outcome, datetime.now(timezone.utc).isoformat()
+                )
+                logging.info(f"User {user_id} unreachable ({outcome}), pruned")
+            else:
+                logging.warning(f"Delivery to {user_id} failed ({outcome}): {e}")
+            break
+
+    DELIVERY_OUTCOMES.labels(outcome=outcome).inc()
+    return False
@@ -0,0 +1,145 @@
+import asyncio
+import functools
+import logging
+import os
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telegram.request import HTTPXRequest
+
+import startup
+from metrics import BOT_READY, SHUTDOWN_ABANDONED
+
+# ==========================
+# CONFIG
+# ==========================
+
+# Time in-flight handlers and broadcasts get to finish after SIGTERM;
+# keep it below the container's stop timeout / terminationGracePeriod
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "45"))
+
+# /healthz (process up) and /ready (serving updates) for probes and deploys
+HEALTH_PORT = int(os.getenv("HEALTH_PORT", "8001"))
+
+# ==========================
+# COORDINATOR
+# ==========================
+
+class Coordinator:
+    # On SIGTERM/SIGINT: flip readiness, stop fetching updates, pause the
+    # scheduler, let in-flight work finish (up to SHUTDOWN_TIMEOUT), cancel
+    # what's left, then let the application stop. Storage is closed by
+    # post_shutdown once everything that could write has finished.
+
+    def __init__(self):
+        self.ready = False
+        self.stopping = False
+        self.in_flight = set()
+        self.app = None
+        self._drain_task = None
+        # Set once draining is over; scheduler-only replicas (no updater)
+        # stop on this instead of run_polling returning
+        self.drained = asyncio.Event()
+
+    def install(self, app):
+        # Called from post_init, on the running loop
+        self.app = app
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.begin)
+
+    def set_ready(self, ready):
+        self.ready = ready
+        BOT_READY.set(1 if ready else 0)
+
+    def tracked(self, callback):
+        # Registers the running handler / job so shutdown can wait for it
+        @functools.wraps(callback)
+        async def wrapper(*args, **kwargs):
+            task = asyncio.current_task()
+            self.in_flight.add(task)
+            try:
+                return await callback(*args, **kwargs)
+            finally:
+                self.in_flight.discard(task)
+
+        return wrapper
+
+    def begin(self):
+        if self.stopping:
+            return
+        self.stopping = True
+        self.set_ready(False)
+        logging.info("Shutdown requested, draining")
+        self._drain_task = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self):
+        app = self.app
+
+        # Stop taking new work. Updates already fetched are still handled.
+        if app.updater and app.updater.running:
+            await app.updater.stop()
+        if app.job_queue:
+            app.job_queue.scheduler.pause()
+
+        pending = {task for task in self.in_flight if not task.done()}
+        if pending:
+            logging.info(f"Waiting for {len(pending)} in-flight task(s)")
+            _, pending = await asyncio.wait(pending, timeout=SHUTDOWN_TIMEOUT)
+
+        if pending:
+            SHUTDOWN_ABANDONED.inc(len(pending))
+            logging.warning(
+                f"{len(pending)} task(s) still running after "
+                f"{SHUTDOWN_TIMEOUT:g}s, cancelling"
+            )
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        logging.info("Drain complete, stopping")
+        self.drained.set()
+        if app.updater:
+            app.stop_running()
+
+coordinator = Coordinator()
+
+class PollRequest(HTTPXRequest):
+    # getUpdates transport. The first successful poll is when the bot is
+    # actually serving: readiness flips and start-up timings are exported.
+    # Until then (e.g. 409 while an old instance still polls) /ready is 503.
+
+    async def do_request(self, *args, **kwargs):
+        code, payload = await super().do_request(*args, **kwargs)
+        if code == 200 and not coordinator.ready and not coordinator.stopping:
+            coordinator.set_ready(True)
+            startup.finish()
+        return code, payload
+
+# ==========================
+# HEALTH ENDPOINTS
+# ==========================
+
+class _HealthHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            status = 200
+        elif self.path == "/ready":
+            status = 200 if coordinator.ready else 503
+        else:
+            status = 404
+        self.send_response(status)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        # Probes hit this every few seconds; keep them out of the logs
+        pass
+
+def start_health_server(port=HEALTH_PORT):
+    server = ThreadingHTTPServer(("", port), _HealthHandler)
+    threading.Thread(
+        target=server.serve_forever, name="health", daemon=True
+    ).start()
+    return server
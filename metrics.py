@@ -1,4 +1,4 @@
-from prometheus_client import Counter, Histogram, start_http_server
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
 
 # Total messages received
 MESSAGES_TOTAL = Counter(
@@ -18,5 +18,108 @@ MESSAGE_LATENCY = Histogram(
     "Message processing latency"
 )
 
+# SQLite online backup
+BACKUP_DURATION = Histogram(
+    "sqlite_backup_duration_seconds",
+    "Time taken to write one SQLite snapshot"
+)
+
+BACKUP_FAILURES = Counter(
+    "sqlite_backup_failures_total",
+    "Total failed SQLite snapshots"
+)
+
+BACKUP_LAST_SUCCESS = Gauge(
+    "sqlite_backup_last_success_timestamp_seconds",
+    "Unix time of the last successful SQLite snapshot"
+)
+
+BACKUP_RESTORES = Counter(
+    "sqlite_backup_restores_total",
+    "Total times the database was restored from a snapshot on start"
+)
+
+# Multi-replica scheduling
+SCHEDULER_LEADER = Gauge(
+    "bot_scheduler_leader",
+    "1 if this replica holds the scheduler lease"
+)
+
+PARTITIONS_PROCESSED = Counter(
+    "bot_partitions_processed_total",
+    "Broadcast partitions processed by this replica",
+    ["run"]
+)
+
+# Inbound abuse protection
+COMMANDS_RATE_LIMITED = Counter(
+    "telegram_commands_rate_limited_total",
+    "Commands dropped by the per-user rate limiter"
+)
+
+COMMANDS_COALESCED = Counter(
+    "telegram_commands_coalesced_total",
+    "Duplicate commands folded into one already in flight"
+)
+
+# Broadcast delivery
+DELIVERY_OUTCOMES = Counter(
+    "telegram_delivery_outcomes_total",
+    "Outbound broadcast messages by delivery outcome",
+    ["outcome"]
+)
+
+# Tracing
+TRACE_SPANS_EXPORTED = Counter(
+    "tracing_spans_exported_total",
+    "Spans written to the trace sink"
+)
+
+TRACE_SPANS_DROPPED = Counter(
+    "tracing_spans_dropped_total",
+    "Spans dropped because the export queue was full or the sink failed"
+)
+
+# Admin alerts
+ALERTS_RAISED = Counter(
+    "bot_alerts_raised_total",
+    "Alerts raised, before dedup and digesting",
+    ["severity"]
+)
+
+ALERTS_SENT = Counter(
+    "bot_alerts_sent_total",
+    "Alert messages delivered to the admin chat"
+)
+
+ALERTS_SUPPRESSED = Counter(
+    "bot_alerts_suppressed_total",
+    "Alerts folded into an earlier one or held back by the alert rate limit",
+    ["reason"]
+)
+
+# Lifecycle
+BOT_READY = Gauge(
+    "bot_ready",
+    "1 while the bot is serving updates, 0 while starting or draining"
+)
+
+SHUTDOWN_ABANDONED = Counter(
+    "bot_shutdown_abandoned_tasks_total",
+    "Handlers or jobs cancelled because they outlived the shutdown deadline"
+)
+
+# Cold start
+STARTUP_PHASE_SECONDS = Gauge(
+    "bot_startup_phase_seconds",
+    "Time spent in each start-up phase of this process",
+    ["phase"]
+)
+
+STARTUP_SECONDS = Gauge(
+    "bot_startup_seconds",
+    "Time from process start to the first successful getUpdates"
+)
+
 def start_metrics_server(port: int = 8000):
     start_http_server(port)
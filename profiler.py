@@ -0,0 +1,131 @@
+import asyncio
+import collections
+import os
+import signal
+import sys
+import threading
+
+# ==========================
+# CONFIG
+# ==========================
+
+# Seconds between stack samples (5ms = 200 samples/s)
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "300"))
+
+# Leaf frames that mean "waiting for work", kept out of the top list
+IDLE_FRAMES = ("select (selectors.py", "_worker (thread.py", "wait (threading.py")
+
+# ==========================
+# SAMPLER
+# ==========================
+
+class Sampler:
+    # Wall-clock stack sampler driven by an interval timer (SIGALRM). The
+    # handler runs on the event loop thread between bytecodes, so it sees
+    # exactly what the loop was doing (handler, job callback, or idle in
+    # select()); other threads (SQLite writer, to_thread workers) are
+    # read from sys._current_frames() at the same tick. A sampler thread
+    # would be biased: it only gets the GIL when the loop releases it.
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()  # "thread;f1;f2;..." -> samples
+        self.samples = 0
+        self._previous = None
+
+    @staticmethod
+    def _label(frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _record(self, thread_name, frame):
+        stack = []
+        while frame is not None:
+            stack.append(self._label(frame))
+            frame = frame.f_back
+        stack.append(thread_name)
+        self.stacks[";".join(reversed(stack))] += 1
+
+    def _tick(self, signum, frame):
+        main_id = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+
+        self._record(names.get(main_id, "MainThread"), frame)
+        for thread_id, other in sys._current_frames().items():
+            if thread_id != main_id:
+                self._record(names.get(thread_id, f"thread-{thread_id}"), other)
+        self.samples += 1
+
+    def start(self):
+        # Must be called from the main thread (signal handlers live there)
+        self._previous = signal.signal(signal.SIGALRM, self._tick)
+        signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, self._previous or signal.SIG_DFL)
+
+    def collapsed(self):
+        # Brendan Gregg's folded format: feed to flamegraph.pl or speedscope
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+    def loop_busy(self):
+        # Share of samples where the event loop thread was running code
+        # rather than waiting in select()
+        busy = sum(
+            count for stack, count in self.stacks.items()
+            if stack.startswith("MainThread;")
+            and not stack.rsplit(";", 1)[-1].startswith(IDLE_FRAMES)
+        )
+        return busy / max(self.samples, 1)
+
+    def top(self, limit=15):
+        # -> [(function, self_samples, total_samples)] by self time
+        own = collections.Counter()
+        total = collections.Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if not frames or frames[-1].startswith(IDLE_FRAMES):
+                continue
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        return [(name, n, total[name]) for name, n in own.most_common(limit)]
+
+# ==========================
+# SESSION
+# ==========================
+
+_lock = asyncio.Lock()
+
+def busy():
+    return _lock.locked()
+
+async def profile(seconds):
+    # One session at a time; the event loop keeps serving updates while
+    # the timer samples it
+    async with _lock:
+        sampler = Sampler()
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            sampler.stop()
+        return sampler
+
+def report(sampler, seconds):
+    lines = [
+        f"🔬 Profile: {seconds}s, {sampler.samples} samples "
+        f"every {sampler.interval * 1000:g}ms",
+        f"⚙️ Event loop busy: {sampler.loop_busy() * 100:.1f}%\n",
+        "self%  total%  function (idle waits excluded)",
+    ]
+    samples = max(sampler.samples, 1)
+    for name, own, total in sampler.top():
+        lines.append(
+            f"{own * 100 / samples:5.1f}  {total * 100 / samples:6.1f}  {name}"
+        )
+    return "\n".join(lines)
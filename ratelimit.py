@@ -0,0 +1,117 @@
+import functools
+import os
+import time
+
+from metrics import COMMANDS_COALESCED, COMMANDS_RATE_LIMITED
+
+# ==========================
+# CONFIG
+# ==========================
+
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "5"))
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "20"))
+
+# ==========================
+# TOKEN BUCKET
+# ==========================
+
+class RateLimiter:
+    # One token bucket per user: `burst` commands at once, refilled at
+    # `per_minute`. A limited user is told once, then dropped silently
+    # until a token is available again.
+
+    SWEEP_EVERY = 1000
+
+    def __init__(self, burst=RATE_LIMIT_BURST, per_minute=RATE_LIMIT_PER_MINUTE):
+        self.burst = burst
+        self.rate = per_minute / 60
+        self.buckets = {}  # user_id -> [tokens, updated_at, warned]
+        self.calls = 0
+
+    def _refill(self, bucket, now):
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+
+    def allow(self, user_id):
+        # -> (allowed, warn): `warn` is True only on the first rejection
+        now = time.monotonic()
+
+        # Sweep first: a sweep after the lookup could drop this user's
+        # bucket and lose the token taken below
+        self.calls += 1
+        if self.calls % self.SWEEP_EVERY == 0:
+            self._sweep(now)
+
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            bucket = self.buckets[user_id] = [self.burst, now, False]
+        else:
+            self._refill(bucket, now)
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            bucket[2] = False
+            return True, False
+
+        warn = not bucket[2]
+        bucket[2] = True
+        return False, warn
+
+    def _sweep(self, now):
+        # Full buckets carry no state, so idle users don't pile up in memory
+        for user_id, bucket in list(self.buckets.items()):
+            self._refill(bucket, now)
+            if bucket[0] >= self.burst:
+                del self.buckets[user_id]
+
+# ==========================
+# COALESCING
+# ==========================
+
+class Coalescer:
+    # Identical commands from the same user that arrive while the first
+    # one is still running are answered by that first run.
+
+    def __init__(self):
+        self.in_flight = set()
+
+    async def run(self, key, fn):
+        if key in self.in_flight:
+            COMMANDS_COALESCED.inc()
+            return None
+
+        self.in_flight.add(key)
+        try:
+            return await fn()
+        finally:
+            self.in_flight.discard(key)
+
+limiter = RateLimiter()
+coalescer = Coalescer()
+
+def guarded(callback):
+    # Wraps a handler callback with the per-user limiter and coalescer
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        user = update.effective_user
+        if user is None:
+            return await callback(update, context)
+
+        allowed, warn = limiter.allow(user.id)
+        if not allowed:
+            COMMANDS_RATE_LIMITED.inc()
+            if warn and update.message:
+                await update.message.reply_text(
+                    "⏳ Too many requests.\nPlease wait a minute and try again."
+                )
+            return None
+
+        text = update.message.text if update.message else None
+        document = update.message.document if update.message else None
+        if document is not None:
+            # Uploads carry no text; two different files aren't duplicates
+            text = document.file_unique_id
+        key = (user.id, (text or "").strip() or callback.__name__)
+        return await coalescer.run(key, lambda: callback(update, context))
+
+    return wrapper
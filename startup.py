@@ -0,0 +1,74 @@
+import contextlib
+import logging
+import os
+import time
+
+# Imported first by bot.py, so this is (close to) the start of the program
+_T0 = time.perf_counter()
+
+# ==========================
+# PHASES
+# ==========================
+
+# Sequential segments from mark() (interpreter, imports, app_build,
+# initialize, post_init, first_poll) cover the whole start-up; phase()
+# records nested sub-steps (db_restore, db_open, migrations), summed when
+# they run more than once (one per shard).
+phases = {}
+
+_last_mark = _T0
+_finished = False
+
+def _process_age():
+    # Seconds since exec(), interpreter start-up included (Linux only)
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 0.0)
+    except (OSError, ValueError, IndexError):
+        return None
+
+_interpreter = _process_age()
+if _interpreter is not None:
+    phases["interpreter"] = _interpreter
+
+def mark(name):
+    # Records the time since the previous mark as `name`
+    global _last_mark
+    now = time.perf_counter()
+    phases[name] = phases.get(name, 0.0) + (now - _last_mark)
+    _last_mark = now
+
+@contextlib.contextmanager
+def phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0.0) + (time.perf_counter() - start)
+
+def elapsed():
+    # Seconds from process start (or this module's import) until now
+    return (_interpreter or 0.0) + time.perf_counter() - _T0
+
+def finish(name="first_poll"):
+    # Closes the last segment and exports everything; later calls no-op
+    global _finished
+    if _finished:
+        return
+    _finished = True
+    mark(name)
+    total = elapsed()
+
+    from metrics import STARTUP_PHASE_SECONDS, STARTUP_SECONDS
+    for phase_name, seconds in phases.items():
+        STARTUP_PHASE_SECONDS.labels(phase=phase_name).set(seconds)
+    STARTUP_SECONDS.set(total)
+
+    logging.info(
+        f"Started in {total:.2f}s ("
+        + ", ".join(f"{k} {v * 1000:.0f}ms" for k, v in phases.items())
+        + ")"
+    )
@@ -0,0 +1,1396 @@
+import asyncio
+import itertools
+import logging
+import os
+import re
+import sqlite3
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import backup
+import startup
+import tracing
+
+# ==========================
+# CONFIG
+# ==========================
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+DB_PATH = os.getenv("DB_PATH", "/data/jobs.db")
+
+# >1 spreads user_skills/applied_jobs over that many SQLite files
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+
+Profile = namedtuple(
+    "Profile",
+    "user_id skills location exp_min exp_max work_mode last_job_url active"
+)
+
+PROFILE_COLUMNS = (
+    "user_id, skills, location, exp_min, exp_max, "
+    "work_mode, last_job_url, active"
+)
+
+APPLIED_JOBS_SCHEMA = """
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    company_id INTEGER NOT NULL REFERENCES companies(id),
+    role_id INTEGER NOT NULL REFERENCES roles(id),
+    applied_at TEXT,
+    followup_after INTEGER DEFAULT 5,
+    link TEXT,
+    followup_due_at TEXT,
+    UNIQUE(user_id, company_id, role_id)
+"""
+
+# SQLite expression for when a follow-up falls due (UTC, datetime() format)
+FOLLOWUP_DUE_SQL = "datetime({applied_at}, '+' || COALESCE({days}, 5) || ' days')"
+
+def normalize_name(value):
+    # Trim and collapse whitespace; case is handled by the NOCASE keys
+    return " ".join((value or "").split())
+
+def search_terms(query):
+    # Letters/digits runs, the same split both full-text indexes use; each
+    # backend turns them into its own prefix query, so user input never
+    # reaches the query syntax
+    return re.findall(r"[^\W_]+", (query or "").lower())[:8]
+
+# ==========================
+# INTERFACE
+# ==========================
+
+class Storage:
+    # Every persistence operation the bot needs. Implementations must be
+    # safe to call from the event loop; timestamps are ISO-8601 strings.
+
+    # Independent writers behind this backend; broadcasts use one worker each
+    shard_count = 1
+
+    async def connect(self):
+        raise NotImplementedError
+
+    async def close(self):
+        raise NotImplementedError
+
+    def snapshot_targets(self):
+        # {snapshot name: sqlite3.Connection} for the backup job
+        return {}
+
+    # ---- user_skills ----
+
+    async def activate_user(self, user_id):
+        raise NotImplementedError
+
+    async def get_profile(self, user_id):
+        raise NotImplementedError
+
+    async def upsert_skills(self, user_id, skills):
+        raise NotImplementedError
+
+    async def update_skills(self, user_id, skills):
+        # -> True if the user had a profile
+        raise NotImplementedError
+
+    async def set_preferences(self, user_id, location, exp_min, exp_max, work_mode):
+        # -> True if the user had a profile
+        raise NotImplementedError
+
+    async def set_last_job_url(self, user_id, url):
+        raise NotImplementedError
+
+    async def set_active(self, user_id, active):
+        raise NotImplementedError
+
+    async def active_profiles(self, partition=None):
+        # partition=(index, count) limits rows to one user_id shard;
+        # unreachable users are left out
+        raise NotImplementedError
+
+    async def mark_unreachable(self, user_id, reason, at):
+        # Permanent delivery failure; cleared by activate_user (/start)
+        raise NotImplementedError
+
+    # ---- applied_jobs ----
+
+    async def add_applied(self, user_id, company, role, applied_at, followup_after, link):
+        # -> False if this company/role is already tracked (any case)
+        raise NotImplementedError
+
+    async def list_applied(self, user_id):
+        # -> [(company, role, applied_at, followup_after, link)], newest first
+        raise NotImplementedError
+
+    async def import_applied(self, user_id, rows, batch=500):
+        # Upserts an iterable of (company, role, applied_at, followup_after,
+        # link) in one transaction, `batch` rows per round; existing entries
+        # keep applied_at. -> (added, updated)
+        raise NotImplementedError
+
+    def export_applied(self, user_id, batch=500):
+        # Async iterator of row batches, same shape as list_applied, oldest
+        # first, without loading them all at once
+        raise NotImplementedError
+
+    async def count_applied(self, user_id):
+        raise NotImplementedError
+
+    async def remove_applied(self, user_id, company, role):
+        # -> number of rows removed
+        raise NotImplementedError
+
+    async def remove_all_applied(self, user_id):
+        raise NotImplementedError
+
+    async def active_applied(self, partition=None):
+        # -> [(user_id, company, role, applied_at)] for active, reachable users
+        raise NotImplementedError
+
+    async def search_applied(self, user_id, query, limit, offset=0):
+        # Full-text prefix match on company/role/link, best match first;
+        # rows shaped like list_applied
+        raise NotImplementedError
+
+    # ---- job_actions / activity rollups ----
+
+    async def get_status(self, user_id, now):
+        # -> (Profile, applied_count, due_count) in one read, or None
+        raise NotImplementedError
+
+    async def log_action(self, user_id, action, at):
+        raise NotImplementedError
+
+    async def weekly_activity(self, week, partition=None):
+        # -> [(user_id, action, count)] for the week starting Monday `week`,
+        # active and reachable users only
+        raise NotImplementedError
+
+    # ---- bot_health / crash_log ----
+
+    async def record_heartbeat(self, at):
+        raise NotImplementedError
+
+    async def record_startup(self, at):
+        raise NotImplementedError
+
+    async def count_startups_since(self, since):
+        raise NotImplementedError
+
+    # ---- leases / work partitions ----
+
+    async def acquire_lease(self, name, holder, ttl, now):
+        # Take or renew `name` for `ttl` seconds; -> True if `holder` owns it
+        raise NotImplementedError
+
+    async def release_lease(self, name, holder):
+        raise NotImplementedError
+
+    async def create_work_partitions(self, run_id, count, now):
+        raise NotImplementedError
+
+    async def claim_partition(self, run_id, holder, now, stale_before):
+        # -> partition number, or None when nothing is left to claim
+        raise NotImplementedError
+
+    async def complete_partition(self, run_id, part, holder):
+        raise NotImplementedError
+
+    async def renew_claim(self, run_id, part, holder, now):
+        # -> False if `holder` no longer owns the partition
+        raise NotImplementedError
+
+    async def release_partition(self, run_id, part, holder):
+        # Unfinished partition back to the pool, claimable at once
+        raise NotImplementedError
+
+    async def unfinished_partitions(self, run_id):
+        raise NotImplementedError
+
+    async def unfinished_runs(self, since):
+        # -> [(run_id, partition count)] created since `since`, oldest first
+        raise NotImplementedError
+
+# ==========================
+# SQLITE
+# ==========================
+
+class SQLiteStorage(Storage):
+
+    def __init__(self, path=DB_PATH, standalone=True):
+        self.path = path
+        # False for the base/shard files of a ShardedSQLiteStorage, which
+        # checks the layout itself
+        self.standalone = standalone
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.conn = None
+        self.is_new = False
+        # Every statement runs on this one thread: the event loop never
+        # blocks on SQLite and writes to this file never contend in-process
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"sqlite-{self.name}"
+        )
+
+    async def connect(self):
+        # Bring back the last snapshot if the volume was wiped (pod reschedule)
+        with startup.phase("db_restore"):
+            backup.restore_if_missing(self.path, self.name)
+        self.is_new = not os.path.exists(self.path)
+
+        await self._call(self._open)
+
+    def _open(self):
+        with startup.phase("db_open"):
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.create_function(
+                "normalize_name", 1, normalize_name, deterministic=True
+            )
+            self.conn.execute("PRAGMA journal_mode=WAL;")
+            self.conn.execute("PRAGMA synchronous=NORMAL;")
+        with startup.phase("migrations"):
+            self._migrate()
+        if self.standalone:
+            self._check_unsharded()
+
+    def _check_unsharded(self):
+        # Once split, user rows live only in the shard files; opening the
+        # base file alone would look like every user vanished
+        recorded = self._get_setting("shard_count")
+        if recorded == "1":
+            return
+
+        root, ext = os.path.splitext(self.path)
+        if recorded is None and not os.path.exists(f"{root}-shard0{ext}"):
+            self._set_setting("shard_count", 1)
+            self.conn.commit()
+            return
+
+        # No record but shard files: split before the count was stored
+        raise RuntimeError(
+            f"{self.path} is split into shard files; start with "
+            f"SHARD_COUNT={recorded or 'the count it was split with'}"
+        )
+
+    def _get_setting(self, key):
+        row = self.conn.execute(
+            "SELECT value FROM storage_settings WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_setting(self, key, value):
+        self.conn.execute("""
+            INSERT INTO storage_settings (key, value) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """, (key, str(value)))
+
+    async def get_setting(self, key):
+        return await self._call(self._get_setting, key)
+
+    async def set_setting(self, key, value):
+        def write():
+            self._set_setting(key, value)
+            self.conn.commit()
+
+        await self._call(write)
+
+    async def close(self):
+        # Queued writes run first (single FIFO worker); the checkpoint then
+        # folds the WAL back into the main file so nothing depends on -wal
+        if self.conn is not None:
+            await self._call(self._close)
+            self.conn = None
+        self._executor.shutdown(wait=True)
+
+    def _close(self):
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+        self.conn.close()
+
+    async def _call(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        with tracing.span("sqlite", **{"db.name": self.name}) as span:
+            if span is None:
+                return await loop.run_in_executor(self._executor, fn, *args)
+            return await loop.run_in_executor(
+                self._executor, self._traced, span, fn, *args
+            )
+
+    def _traced(self, parent, fn, *args):
+        # Runs on the writer thread. The outer span covers the executor
+        # queue wait; each statement fn executes gets a child span, from
+        # its start to the next statement (or the end of fn).
+        statements = []
+
+        def on_statement(sql):
+            if statements:
+                statements[-1].end()
+            statements.append(tracing.start_span(
+                f"sql {sql.split(None, 1)[0].upper()}" if sql.strip() else "sql",
+                parent=parent, **{"db.statement": " ".join(sql.split())[:500]}
+            ))
+
+        self.conn.set_trace_callback(on_statement)
+        try:
+            return fn(*args)
+        finally:
+            self.conn.set_trace_callback(None)
+            if statements:
+                statements[-1].end()
+
+    async def import_partition(self, source_path, partition):
+        # Copy one user_id bucket of an unsharded database into this file.
+        # Every insert ignores rows already here and the rollups are rebuilt,
+        # so a split interrupted half-way is simply redone on the next start.
+        bucket = (partition[1], partition[0])
+
+        def copy():
+            self.conn.execute("ATTACH DATABASE ? AS src", (source_path,))
+            try:
+                self.conn.execute(f"""
+                    INSERT OR IGNORE INTO main.user_skills ({PROFILE_COLUMNS})
+                    SELECT {PROFILE_COLUMNS} FROM src.user_skills
+                    WHERE ABS(user_id) % ? = ?
+                """, (partition[1], partition[0]))
+                for table, column in (("companies", "company_id"), ("roles", "role_id")):
+                    self.conn.execute(f"""
+                        INSERT OR IGNORE INTO main.{table} (name)
+                        SELECT s.name FROM src.{table} s
+                        WHERE s.id IN (
+                            SELECT {column} FROM src.applied_jobs
+                            WHERE ABS(user_id) % ? = ?
+                        )
+                    """, (partition[1], partition[0]))
+                marker = self.conn.execute(
+                    "SELECT COALESCE(MAX(id), 0) FROM main.job_actions"
+                ).fetchone()[0]
+
+                # Ids differ between files, so remap through the names
+                self.conn.execute("""
+                    INSERT OR IGNORE INTO main.applied_jobs
+                    (user_id, company_id, role_id, applied_at, followup_after, link,
+                     followup_due_at)
+                    SELECT a.user_id, c.id, r.id, a.applied_at, a.followup_after,
+                           a.link, a.followup_due_at
+                    FROM src.applied_jobs a
+                    JOIN src.companies sc ON sc.id = a.company_id
+                    JOIN src.roles sr ON sr.id = a.role_id
+                    JOIN main.companies c ON c.name = sc.name
+                    JOIN main.roles r ON r.name = sr.name
+                    WHERE ABS(a.user_id) % ? = ?
+                """, (partition[1], partition[0]))
+
+                # The insert triggers logged an 'apply' per copied row; the
+                # source's own action history replaces those
+                self.conn.execute(
+                    "DELETE FROM main.job_actions WHERE id > ?", (marker,)
+                )
+                self.conn.execute("""
+                    INSERT OR IGNORE INTO main.job_actions
+                    (id, user_id, action, action_at)
+                    SELECT id, user_id, action, action_at FROM src.job_actions
+                    WHERE ABS(user_id) % ? = ?
+                """, bucket)
+
+                self.conn.execute(
+                    "DELETE FROM main.weekly_activity WHERE ABS(user_id) % ? = ?",
+                    bucket
+                )
+                self.conn.execute("""
+                    INSERT INTO main.weekly_activity (week, user_id, action, count)
+                    SELECT date(action_at, 'weekday 0', '-6 days'), user_id, action,
+                           COUNT(*)
+                    FROM main.job_actions WHERE ABS(user_id) % ? = ?
+                    GROUP BY 1, 2, 3
+                """, bucket)
+                self.conn.execute(
+                    "DELETE FROM main.user_activity WHERE ABS(user_id) % ? = ?",
+                    bucket
+                )
+                self.conn.execute("""
+                    INSERT INTO main.user_activity (user_id, applied_count)
+                    SELECT user_id, COUNT(*) FROM main.applied_jobs
+                    WHERE ABS(user_id) % ? = ?
+                    GROUP BY user_id
+                """, bucket)
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+            finally:
+                self.conn.execute("DETACH DATABASE src")
+
+        await self._call(copy)
+
+    async def finish_split(self, shard_count):
+        # Base file, once every shard holds its copy: drop the per-user rows
+        # so they are neither imported again nor snapshotted, and record the
+        # layout in the same transaction
+        def finish():
+            try:
+                for table in ("applied_jobs", "user_skills", "job_actions",
+                              "weekly_activity", "user_activity",
+                              "companies", "roles"):
+                    self.conn.execute(f"DELETE FROM {table}")
+                self._set_setting("shard_count", shard_count)
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+
+        await self._call(finish)
+
+    def snapshot_targets(self):
+        return {self.name: self.conn}
+
+    def _migrate(self):
+        cursor = self.conn.cursor()
+
+        # Company / role names are stored once and referenced by id.
+        # NOCASE keys make "Amazon" and "amazon" the same row and let
+        # case-insensitive lookups use the unique index.
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS companies (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE COLLATE NOCASE
+        )
+        """)
+
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS roles (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE COLLATE NOCASE
+        )
+        """)
+
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS applied_jobs ({APPLIED_JOBS_SCHEMA})")
+
+        # DB MIGRATION (ONE-TIME SAFE)
+        cursor.execute("PRAGMA table_info(applied_jobs)")
+        columns = [c[1] for c in cursor.fetchall()]
+
+        if "company" in columns:
+            # The rebuilt table already has every current column
+            self._migrate_legacy_applied_jobs(cursor, columns)
+        else:
+            if "followup_due_at" not in columns:
+                cursor.execute(
+                    "ALTER TABLE applied_jobs ADD COLUMN followup_due_at TEXT"
+                )
+                cursor.execute(f"""
+                    UPDATE applied_jobs SET followup_due_at = {FOLLOWUP_DUE_SQL.format(
+                        applied_at="applied_at", days="followup_after"
+                    )}
+                """)
+            if "id" not in columns:
+                self._migrate_applied_jobs_id(cursor)
+
+        # /status counts due follow-ups with a range scan on this index
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS applied_jobs_due
+            ON applied_jobs (user_id, followup_due_at)
+        """)
+
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_skills (
+            user_id INTEGER PRIMARY KEY,
+            skills TEXT,
+            location TEXT DEFAULT 'india',
+            exp_min INTEGER DEFAULT 0,
+            exp_max INTEGER DEFAULT 30,
+            work_mode TEXT
+        )
+        """)
+
+        cursor.execute("PRAGMA table_info(user_skills)")
+        columns = [c[1] for c in cursor.fetchall()]
+
+        if "active" not in columns:
+            cursor.execute(
+                "ALTER TABLE user_skills ADD COLUMN active INTEGER DEFAULT 1"
+            )
+
+        if "last_job_url" not in columns:
+            cursor.execute(
+                "ALTER TABLE user_skills ADD COLUMN last_job_url TEXT"
+            )
+
+        if "reachable" not in columns:
+            cursor.execute(
+                "ALTER TABLE user_skills ADD COLUMN reachable INTEGER DEFAULT 1"
+            )
+            cursor.execute(
+                "ALTER TABLE user_skills ADD COLUMN unreachable_reason TEXT"
+            )
+            cursor.execute(
+                "ALTER TABLE user_skills ADD COLUMN unreachable_at TEXT"
+            )
+
+        # Broadcast recipients only; blocked/deleted users drop out of it
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS user_skills_deliverable
+            ON user_skills (user_id) WHERE active = 1 AND reachable = 1
+        """)
+
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS bot_health (
+            id INTEGER PRIMARY KEY,
+            last_heartbeat TEXT
+        )
+        """)
+
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS crash_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            occurred_at TEXT
+        )
+        """)
+
+        # Layout facts checked at start-up (shard_count)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS storage_settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        """)
+
+        self._migrate_activity(cursor)
+        self._migrate_search(cursor)
+
+        # Scheduler leader lease and per-run work partitions (epoch seconds)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """)
+
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS work_partitions (
+            run_id TEXT NOT NULL,
+            part INTEGER NOT NULL,
+            owner TEXT,
+            claimed_at REAL,
+            done INTEGER DEFAULT 0,
+            created_at REAL,
+            PRIMARY KEY (run_id, part)
+        )
+        """)
+
+        self.conn.commit()
+
+    def _migrate_legacy_applied_jobs(self, cursor, columns):
+        # Old layout kept company/role text on every row: intern the names,
+        # then rebuild the table around the ids. Case-only duplicates
+        # collapse into the oldest row.
+        if "followup_after" not in columns:
+            cursor.execute(
+                "ALTER TABLE applied_jobs ADD COLUMN followup_after INTEGER DEFAULT 5"
+            )
+
+        if "link" not in columns:
+            cursor.execute(
+                "ALTER TABLE applied_jobs ADD COLUMN link TEXT"
+            )
+
+        cursor.execute("""
+            INSERT OR IGNORE INTO companies (name)
+            SELECT normalize_name(company) FROM applied_jobs
+            WHERE normalize_name(company) != ''
+            ORDER BY rowid
+        """)
+        cursor.execute("""
+            INSERT OR IGNORE INTO roles (name)
+            SELECT normalize_name(role) FROM applied_jobs
+            WHERE normalize_name(role) != ''
+            ORDER BY rowid
+        """)
+
+        cursor.execute(f"CREATE TABLE applied_jobs_new ({APPLIED_JOBS_SCHEMA})")
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO applied_jobs_new
+            (user_id, company_id, role_id, applied_at, followup_after, link,
+             followup_due_at)
+            SELECT a.user_id, c.id, r.id, a.applied_at, a.followup_after, a.link,
+                   {FOLLOWUP_DUE_SQL.format(
+                       applied_at="a.applied_at", days="a.followup_after"
+                   )}
+            FROM applied_jobs a
+            JOIN companies c ON c.name = normalize_name(a.company)
+            JOIN roles r ON r.name = normalize_name(a.role)
+            ORDER BY a.rowid
+        """)
+        cursor.execute("DROP TABLE applied_jobs")
+        cursor.execute("ALTER TABLE applied_jobs_new RENAME TO applied_jobs")
+
+    def _migrate_applied_jobs_id(self, cursor):
+        # Without an INTEGER PRIMARY KEY the implicit rowid may change on
+        # VACUUM, so the search index needs a real key: rebuild around an
+        # explicit id, keeping the current rowids as ids
+        cursor.execute(f"CREATE TABLE applied_jobs_new ({APPLIED_JOBS_SCHEMA})")
+        cursor.execute("""
+            INSERT INTO applied_jobs_new
+            (id, user_id, company_id, role_id, applied_at, followup_after, link,
+             followup_due_at)
+            SELECT rowid, user_id, company_id, role_id, applied_at, followup_after,
+                   link, followup_due_at
+            FROM applied_jobs
+        """)
+        cursor.execute("DROP TABLE applied_jobs")
+        cursor.execute("ALTER TABLE applied_jobs_new RENAME TO applied_jobs")
+
+    def _migrate_activity(self, cursor):
+        # job_actions is the raw event log; user_activity and weekly_activity
+        # are rollups kept current by triggers, so readers never aggregate
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'job_actions'"
+        )
+        is_new = cursor.fetchone() is None
+
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_actions (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            action_at TEXT NOT NULL
+        )
+        """)
+
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_activity (
+            user_id INTEGER PRIMARY KEY,
+            applied_count INTEGER NOT NULL DEFAULT 0
+        )
+        """)
+
+        # week = the Monday (UTC) the action falls in
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS weekly_activity (
+            week TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (week, user_id, action)
+        ) WITHOUT ROWID
+        """)
+
+        if is_new:
+            cursor.execute("""
+                INSERT INTO user_activity (user_id, applied_count)
+                SELECT user_id, COUNT(*) FROM applied_jobs GROUP BY user_id
+            """)
+
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS applied_jobs_after_insert
+        AFTER INSERT ON applied_jobs
+        BEGIN
+            INSERT INTO user_activity (user_id, applied_count)
+            VALUES (NEW.user_id, 1)
+            ON CONFLICT(user_id) DO UPDATE SET applied_count = applied_count + 1;
+
+            INSERT INTO job_actions (user_id, action, action_at)
+            VALUES (NEW.user_id, 'apply', NEW.applied_at);
+        END
+        """)
+
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS applied_jobs_after_delete
+        AFTER DELETE ON applied_jobs
+        BEGIN
+            UPDATE user_activity SET applied_count = applied_count - 1
+            WHERE user_id = OLD.user_id;
+        END
+        """)
+
+        cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS job_actions_after_insert
+        AFTER INSERT ON job_actions
+        BEGIN
+            INSERT INTO weekly_activity (week, user_id, action, count)
+            VALUES (
+                date(NEW.action_at, 'weekday 0', '-6 days'),
+                NEW.user_id, NEW.action, 1
+            )
+            ON CONFLICT(week, user_id, action) DO UPDATE SET count = count + 1;
+        END
+        """)
+
+        if is_new:
+            # Past applications become 'apply' events (rolled up by trigger)
+            cursor.execute("""
+                INSERT INTO job_actions (user_id, action, action_at)
+                SELECT user_id, 'apply', applied_at FROM applied_jobs
+                WHERE applied_at IS NOT NULL
+                ORDER BY applied_at
+            """)
+
+    def _migrate_search(self, cursor):
+        # FTS5 index over each applied job's company/role/link, rowid =
+        # applied_jobs.id. `owner` holds a per-user token so /search is a
+        # pure index lookup instead of matching across every user's rows.
+        # External content: the text lives only in applied_jobs/companies/
+        # roles (read through applied_jobs_search), the index stores none.
+        cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'applied_jobs_fts'"
+        )
+        row = cursor.fetchone()
+        if row and "content" not in row[0]:
+            # First layout copied the names into the index, keyed on rowid
+            for trigger in ("insert", "delete", "update"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS applied_jobs_fts_{trigger}")
+            cursor.execute("DROP TABLE applied_jobs_fts")
+            row = None
+
+        cursor.execute("""
+        CREATE VIEW IF NOT EXISTS applied_jobs_search AS
+        SELECT a.id, 'u' || ABS(a.user_id) AS owner, c.name AS company,
+               r.name AS role, a.link
+        FROM applied_jobs a
+        JOIN companies c ON c.id = a.company_id
+        JOIN roles r ON r.id = a.role_id
+        """)
+
+        cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS applied_jobs_fts USING fts5(
+            owner, company, role, link,
+            content = 'applied_jobs_search',
+            content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+        """)
+
+        # An external-content index is kept in sync by hand; 'delete' must
+        # be given the values that were indexed
+        fts_row = """
+            SELECT {row}.id, 'u' || ABS({row}.user_id),
+                   (SELECT name FROM companies WHERE id = {row}.company_id),
+                   (SELECT name FROM roles WHERE id = {row}.role_id),
+                   {row}.link
+        """
+        insert = f"""
+            INSERT INTO applied_jobs_fts (rowid, owner, company, role, link)
+            {fts_row.format(row="NEW")};
+        """
+        delete = f"""
+            INSERT INTO applied_jobs_fts (applied_jobs_fts, rowid, owner, company, role, link)
+            SELECT 'delete', * FROM ({fts_row.format(row="OLD")});
+        """
+
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS applied_jobs_fts_insert
+        AFTER INSERT ON applied_jobs
+        BEGIN
+            {insert}
+        END
+        """)
+
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS applied_jobs_fts_delete
+        AFTER DELETE ON applied_jobs
+        BEGIN
+            {delete}
+        END
+        """)
+
+        # Upserts (bulk import) rewrite link on existing rows
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS applied_jobs_fts_update
+        AFTER UPDATE OF user_id, company_id, role_id, link ON applied_jobs
+        BEGIN
+            {delete}
+            {insert}
+        END
+        """)
+
+        if row is None:
+            cursor.execute(
+                "INSERT INTO applied_jobs_fts (applied_jobs_fts) VALUES ('rebuild')"
+            )
+
+    def _write_sync(self, sql, params=()):
+        cursor = self.conn.execute(sql, params)
+        self.conn.commit()
+        return cursor.rowcount
+
+    async def _write(self, sql, params=()):
+        return await self._call(self._write_sync, sql, params)
+
+    async def _fetchone(self, sql, params=()):
+        return await self._call(
+            lambda: self.conn.execute(sql, params).fetchone()
+        )
+
+    async def _fetchall(self, sql, params=()):
+        return await self._call(
+            lambda: self.conn.execute(sql, params).fetchall()
+        )
+
+    # ---- user_skills ----
+
+    async def activate_user(self, user_id):
+        await self._write("""
+            INSERT INTO user_skills (user_id, active)
+            VALUES (?, 1)
+            ON CONFLICT(user_id) DO UPDATE SET
+                active = 1, reachable = 1, unreachable_reason = NULL
+        """, (user_id,))
+
+    async def get_profile(self, user_id):
+        row = await self._fetchone(
+            f"SELECT {PROFILE_COLUMNS} FROM user_skills WHERE user_id = ?",
+            (user_id,)
+        )
+        return Profile(*row) if row else None
+
+    async def upsert_skills(self, user_id, skills):
+        await self._write("""
+            INSERT INTO user_skills (user_id, skills, active)
+            VALUES (?, ?, 1)
+            ON CONFLICT(user_id)
+            DO UPDATE SET skills = excluded.skills
+        """, (user_id, skills))
+
+    async def update_skills(self, user_id, skills):
+        return await self._write(
+            "UPDATE user_skills SET skills = ? WHERE user_id = ?",
+            (skills, user_id)
+        ) > 0
+
+    async def set_preferences(self, user_id, location, exp_min, exp_max, work_mode):
+        return await self._write("""
+            UPDATE user_skills
+            SET location = ?, exp_min = ?, exp_max = ?, work_mode = ?
+            WHERE user_id = ?
+        """, (location, exp_min, exp_max, work_mode, user_id)) > 0
+
+    async def set_last_job_url(self, user_id, url):
+        await self._write(
+            "UPDATE user_skills SET last_job_url = ? WHERE user_id = ?",
+            (url, user_id)
+        )
+
+    async def set_active(self, user_id, active):
+        await self._write(
+            "UPDATE user_skills SET active = ? WHERE user_id = ?",
+            (1 if active else 0, user_id)
+        )
+
+    async def active_profiles(self, partition=None):
+        sql = (
+            f"SELECT {PROFILE_COLUMNS} FROM user_skills "
+            "WHERE active = 1 AND reachable = 1"
+        )
+        params = ()
+        if partition:
+            sql += " AND ABS(user_id) % ? = ?"
+            params = (partition[1], partition[0])
+        return [Profile(*row) for row in await self._fetchall(sql, params)]
+
+    async def mark_unreachable(self, user_id, reason, at):
+        await self._write("""
+            UPDATE user_skills
+            SET reachable = 0, unreachable_reason = ?, unreachable_at = ?
+            WHERE user_id = ?
+        """, (reason, at, user_id))
+
+    # ---- applied_jobs ----
+
+    async def add_applied(self, user_id, company, role, applied_at, followup_after, link):
+        company, role = normalize_name(company), normalize_name(role)
+
+        def add():
+            self.conn.execute(
+                "INSERT OR IGNORE INTO companies (name) VALUES (?)", (company,)
+            )
+            self.conn.execute(
+                "INSERT OR IGNORE INTO roles (name) VALUES (?)", (role,)
+            )
+            # The unique (user_id, company_id, role_id) index turns the
+            # duplicate check into a single seek
+            cursor = self.conn.execute(f"""
+                INSERT OR IGNORE INTO applied_jobs
+                (user_id, company_id, role_id, applied_at, followup_after, link,
+                 followup_due_at)
+                VALUES (
+                    ?1,
+                    (SELECT id FROM companies WHERE name = ?2),
+                    (SELECT id FROM roles WHERE name = ?3),
+                    ?4, ?5, ?6,
+                    {FOLLOWUP_DUE_SQL.format(applied_at="?4", days="?5")}
+                )
+            """, (user_id, company, role, applied_at, followup_after, link))
+            self.conn.commit()
+            return cursor.rowcount > 0
+
+        return await self._call(add)
+
+    async def list_applied(self, user_id):
+        return await self._fetchall("""
+            SELECT c.name, r.name, a.applied_at, a.followup_after, a.link
+            FROM applied_jobs a
+            JOIN companies c ON c.id = a.company_id
+            JOIN roles r ON r.id = a.role_id
+            WHERE a.user_id = ?
+            ORDER BY a.applied_at DESC
+        """, (user_id,))
+
+    async def import_applied(self, user_id, rows, batch=500):
+        upsert = f"""
+            INSERT INTO applied_jobs
+            (user_id, company_id, role_id, applied_at, followup_after, link,
+             followup_due_at)
+            VALUES (
+                ?1,
+                (SELECT id FROM companies WHERE name = ?2),
+                (SELECT id FROM roles WHERE name = ?3),
+                ?4, ?5, ?6,
+                {FOLLOWUP_DUE_SQL.format(applied_at="?4", days="?5")}
+            )
+            ON CONFLICT(user_id, company_id, role_id) DO UPDATE SET
+                followup_after = excluded.followup_after,
+                link = COALESCE(excluded.link, applied_jobs.link),
+                followup_due_at = {FOLLOWUP_DUE_SQL.format(
+                    applied_at="applied_jobs.applied_at",
+                    days="excluded.followup_after"
+                )}
+        """
+        count = "SELECT COUNT(*) FROM applied_jobs WHERE user_id = ?"
+
+        def run():
+            # `rows` is consumed here on the writer thread, so parsing an
+            # upload never blocks the event loop
+            rows_iter = iter(rows)
+            processed = 0
+            try:
+                before = self.conn.execute(count, (user_id,)).fetchone()[0]
+                while chunk := list(itertools.islice(rows_iter, batch)):
+                    chunk = [
+                        (user_id, normalize_name(company), normalize_name(role),
+                         applied_at, followup_after, link)
+                        for company, role, applied_at, followup_after, link in chunk
+                    ]
+                    self.conn.executemany(
+                        "INSERT OR IGNORE INTO companies (name) VALUES (?)",
+                        dict.fromkeys((r[1],) for r in chunk)
+                    )
+                    self.conn.executemany(
+                        "INSERT OR IGNORE INTO roles (name) VALUES (?)",
+                        dict.fromkeys((r[2],) for r in chunk)
+                    )
+                    self.conn.executemany(upsert, chunk)
+                    processed += len(chunk)
+                after = self.conn.execute(count, (user_id,)).fetchone()[0]
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+            return after - before, processed - (after - before)
+
+        return await self._call(run)
+
+    async def export_applied(self, user_id, batch=500):
+        cursor = await self._call(lambda: self.conn.execute("""
+            SELECT c.name, r.name, a.applied_at, a.followup_after, a.link
+            FROM applied_jobs a
+            JOIN companies c ON c.id = a.company_id
+            JOIN roles r ON r.id = a.role_id
+            WHERE a.user_id = ?
+            ORDER BY a.applied_at
+        """, (user_id,)))
+        try:
+            while rows := await self._call(cursor.fetchmany, batch):
+                yield rows
+        finally:
+            await self._call(cursor.close)
+
+    async def count_applied(self, user_id):
+        row = await self._fetchone(
+            "SELECT COUNT(*) FROM applied_jobs WHERE user_id = ?",
+            (user_id,)
+        )
+        return row[0]
+
+    async def remove_applied(self, user_id, company, role):
+        company, role = normalize_name(company), normalize_name(role)
+
+        def remove():
+            # NOCASE name lookups + the unique key: index seeks all the way
+            removed = self.conn.execute("""
+                DELETE FROM applied_jobs
+                WHERE user_id = ?
+                  AND company_id = (SELECT id FROM companies WHERE name = ?)
+                  AND role_id = (SELECT id FROM roles WHERE name = ?)
+            """, (user_id, company, role)).rowcount
+            if removed:
+                self.conn.execute("""
+                    INSERT INTO job_actions (user_id, action, action_at)
+                    VALUES (?, 'ignore', ?)
+                """, (user_id, datetime.now(timezone.utc).isoformat()))
+            self.conn.commit()
+            return removed
+
+        return await self._call(remove)
+
+    async def remove_all_applied(self, user_id):
+        def remove():
+            # One 'ignore' per removed entry, in the same transaction
+            self.conn.execute("""
+                INSERT INTO job_actions (user_id, action, action_at)
+                SELECT user_id, 'ignore', ? FROM applied_jobs WHERE user_id = ?
+            """, (datetime.now(timezone.utc).isoformat(), user_id))
+            removed = self.conn.execute(
+                "DELETE FROM applied_jobs WHERE user_id = ?",
+                (user_id,)
+            ).rowcount
+            self.conn.commit()
+            return removed
+
+        return await self._call(remove)
+
+    async def active_applied(self, partition=None):
+        sql = """
+            SELECT a.user_id, c.name, r.name, a.applied_at
+            FROM applied_jobs a
+            JOIN user_skills u ON a.user_id = u.user_id
+            JOIN companies c ON c.id = a.company_id
+            JOIN roles r ON r.id = a.role_id
+            WHERE u.active = 1 AND u.reachable = 1
+        """
+        params = ()
+        if partition:
+            sql += " AND ABS(a.user_id) % ? = ?"
+            params = (partition[1], partition[0])
+        return await self._fetchall(sql, params)
+
+    async def search_applied(self, user_id, query, limit, offset=0):
+        terms = search_terms(query)
+        if not terms:
+            return []
+
+        # Every term as a prefix, all required; names weigh more than links
+        match = f'owner : "u{abs(user_id)}" AND {{company role link}} : (' + " AND ".join(
+            f'"{term}"*' for term in terms
+        ) + ")"
+        # Display columns come from the tables; the index holds no text
+        return await self._fetchall("""
+            SELECT c.name, r.name, a.applied_at, a.followup_after, a.link
+            FROM applied_jobs_fts f
+            JOIN applied_jobs a ON a.id = f.rowid
+            JOIN companies c ON c.id = a.company_id
+            JOIN roles r ON r.id = a.role_id
+            WHERE applied_jobs_fts MATCH ? AND a.user_id = ?
+            ORDER BY bm25(applied_jobs_fts, 0.0, 10.0, 5.0, 1.0), a.applied_at DESC
+            LIMIT ? OFFSET ?
+        """, (match, user_id, limit, offset))
+
+    # ---- job_actions / activity rollups ----
+
+    async def get_status(self, user_id, now):
+        # Profile and rollup are primary-key reads; due follow-ups are a
+        # range scan over applied_jobs_due, which only touches due rows
+        row = await self._fetchone(f"""
+            SELECT {", ".join("u." + c for c in PROFILE_COLUMNS.split(", "))},
+                   COALESCE(a.applied_count, 0),
+                   (SELECT COUNT(*) FROM applied_jobs d
+                    WHERE d.user_id = u.user_id
+                      AND d.followup_due_at <= datetime(?))
+            FROM user_skills u
+            LEFT JOIN user_activity a ON a.user_id = u.user_id
+            WHERE u.user_id = ?
+        """, (now, user_id))
+        if not row:
+            return None
+        return Profile(*row[:-2]), row[-2], row[-1]
+
+    async def log_action(self, user_id, action, at):
+        await self._write(
+            "INSERT INTO job_actions (user_id, action, action_at) VALUES (?, ?, ?)",
+            (user_id, action, at)
+        )
+
+    async def weekly_activity(self, week, partition=None):
+        # Summary recipients only (user_skills_deliverable partial index)
+        sql = """
+            SELECT w.user_id, w.action, w.count
+            FROM weekly_activity w
+            JOIN user_skills u ON u.user_id = w.user_id
+                AND u.active = 1 AND u.reachable = 1
+            WHERE w.week = ?
+        """
+        params = (week,)
+        if partition:
+            sql += " AND ABS(w.user_id) % ? = ?"
+            params += (partition[1], partition[0])
+        return await self._fetchall(sql, params)
+
+    # ---- bot_health / crash_log ----
+
+    async def record_heartbeat(self, at):
+        await self._write("""
+            INSERT INTO bot_health (id, last_heartbeat)
+            VALUES (1, ?)
+            ON CONFLICT(id) DO UPDATE SET last_heartbeat = excluded.last_heartbeat
+        """, (at,))
+
+    async def record_startup(self, at):
+        await self._write(
+            "INSERT INTO crash_log (occurred_at) VALUES (?)",
+            (at,)
+        )
+
+    async def count_startups_since(self, since):
+        row = await self._fetchone(
+            "SELECT COUNT(*) FROM crash_log WHERE occurred_at >= ?",
+            (since,)
+        )
+        return row[0]
+
+    # ---- leases / work partitions ----
+
+    async def acquire_lease(self, name, holder, ttl, now):
+        await self._write("""
+            INSERT INTO leases (name, holder, expires_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE
+            SET holder = excluded.holder, expires_at = excluded.expires_at
+            WHERE leases.holder = excluded.holder OR leases.expires_at < ?
+        """, (name, holder, now + ttl, now))
+        row = await self._fetchone("SELECT holder FROM leases WHERE name = ?", (name,))
+        return row is not None and row[0] == holder
+
+    async def release_lease(self, name, holder):
+        await self._write(
+            "DELETE FROM leases WHERE name = ? AND holder = ?",
+            (name, holder)
+        )
+
+    async def create_work_partitions(self, run_id, count, now):
+        def create():
+            self.conn.executemany("""
+                INSERT OR IGNORE INTO work_partitions (run_id, part, created_at)
+                VALUES (?, ?, ?)
+            """, [(run_id, part, now) for part in range(count)])
+            # Finished runs are only kept for a day
+            self.conn.execute(
+                "DELETE FROM work_partitions WHERE created_at < ?",
+                (now - 86400,)
+            )
+            self.conn.commit()
+
+        await self._call(create)
+
+    async def claim_partition(self, run_id, holder, now, stale_before):
+        # Single statement, so two replicas can never claim the same row
+        def claim():
+            row = self.conn.execute("""
+                UPDATE work_partitions
+                SET owner = ?, claimed_at = ?
+                WHERE run_id = ? AND part = (
+                    SELECT part FROM work_partitions
+                    WHERE run_id = ? AND done = 0
+                      AND (owner IS NULL OR claimed_at < ?)
+                    ORDER BY part
+                    LIMIT 1
+                )
+                RETURNING part
+            """, (holder, now, run_id, run_id, stale_before)).fetchone()
+            self.conn.commit()
+            return row[0] if row else None
+
+        return await self._call(claim)
+
+    async def complete_partition(self, run_id, part, holder):
+        await self._write("""
+            UPDATE work_partitions SET done = 1
+            WHERE run_id = ? AND part = ? AND owner = ?
+        """, (run_id, part, holder))
+
+    async def renew_claim(self, run_id, part, holder, now):
+        return await self._write("""
+            UPDATE work_partitions SET claimed_at = ?
+            WHERE run_id = ? AND part = ? AND owner = ? AND done = 0
+        """, (now, run_id, part, holder)) > 0
+
+    async def release_partition(self, run_id, part, holder):
+        await self._write("""
+            UPDATE work_partitions SET owner = NULL, claimed_at = NULL
+            WHERE run_id = ? AND part = ? AND owner = ? AND done = 0
+        """, (run_id, part, holder))
+
+    async def unfinished_partitions(self, run_id):
+        row = await self._fetchone(
+            "SELECT COUNT(*) FROM work_partitions WHERE run_id = ? AND done = 0",
+            (run_id,)
+        )
+        return row[0]
+
+    async def unfinished_runs(self, since):
+        return await self._fetchall("""
+            SELECT run_id, COUNT(*) FROM work_partitions
+            WHERE created_at >= ?
+            GROUP BY run_id
+            HAVING SUM(done = 0) > 0
+            ORDER BY MIN(created_at)
+        """, (since,))
+
+# ==========================
+# SHARDED SQLITE
+# ==========================
+
+def _routed(name):
+    # Per-user operation: runs on the shard that owns `user_id`
+    async def method(self, user_id, *args, **kwargs):
+        return await getattr(self._shard(user_id), name)(user_id, *args, **kwargs)
+    method.__name__ = name
+    return method
+
+def _global(name):
+    # Bot-wide state lives in the base database
+    async def method(self, *args, **kwargs):
+        return await getattr(self.meta, name)(*args, **kwargs)
+    method.__name__ = name
+    return method
+
+class ShardedSQLiteStorage(Storage):
+    # user_skills/applied_jobs rows live in jobs-shard<N>.db, picked by
+    # ABS(user_id) % shard_count. Each shard has its own writer thread, so
+    # commits for different users no longer queue on one file lock.
+
+    def __init__(self, path=DB_PATH, shard_count=SHARD_COUNT):
+        root, ext = os.path.splitext(path)
+        self.shard_count = shard_count
+        self.meta = SQLiteStorage(path, standalone=False)
+        self.shards = [
+            SQLiteStorage(f"{root}-shard{i}{ext}", standalone=False)
+            for i in range(shard_count)
+        ]
+
+    async def connect(self):
+        await self.meta.connect()
+        await asyncio.gather(*(shard.connect() for shard in self.shards))
+
+        recorded = await self.meta.get_setting("shard_count")
+        if recorded is None:
+            # Layout not recorded yet. All shards new: an unsharded database
+            # (or none) being split now. Otherwise it was split at an
+            # earlier start, before the count was stored.
+            if all(shard.is_new for shard in self.shards):
+                recorded = 1
+                await self.meta.set_setting("shard_count", 1)
+            else:
+                recorded = self.shard_count
+                await self.meta.finish_split(self.shard_count)
+        recorded = int(recorded)
+
+        if recorded == 1:
+            # Spread the base file's rows out, then drop them from it
+            await asyncio.gather(*(
+                shard.import_partition(self.meta.path, (i, self.shard_count))
+                for i, shard in enumerate(self.shards)
+            ))
+            await self.meta.finish_split(self.shard_count)
+            logging.info(f"Split {self.meta.path} into {self.shard_count} shards")
+        elif recorded != self.shard_count:
+            # Users would route to shards that don't hold their rows
+            raise RuntimeError(
+                f"{self.meta.path} is split over {recorded} shard files, "
+                f"not {self.shard_count}; start with SHARD_COUNT={recorded}"
+            )
+
+    async def close(self):
+        await asyncio.gather(*(shard.close() for shard in self.shards))
+        await self.meta.close()
+
+    def snapshot_targets(self):
+        targets = self.meta.snapshot_targets()
+        for shard in self.shards:
+            targets.update(shard.snapshot_targets())
+        return targets
+
+    def _shard(self, user_id):
+        return self.shards[abs(user_id) % self.shard_count]
+
+    def _targets(self, partition):
+        # -> [(shard, filter to apply on it)] covering `partition`
+        if not partition:
+            return [(shard, None) for shard in self.shards]
+
+        index, count = partition
+        if count % self.shard_count == 0:
+            # The whole bucket lives on a single shard
+            shard = self.shards[index % self.shard_count]
+            return [(shard, None if count == self.shard_count else partition)]
+
+        return [(shard, partition) for shard in self.shards]
+
+    async def _fan_out(self, name, partition, *args):
+        # Shards are read in parallel, each on its own thread
+        results = await asyncio.gather(*(
+            getattr(shard, name)(*args, part)
+            for shard, part in self._targets(partition)
+        ))
+        return [row for rows in results for row in rows]
+
+    activate_user = _routed("activate_user")
+    get_profile = _routed("get_profile")
+    upsert_skills = _routed("upsert_skills")
+    update_skills = _routed("update_skills")
+    set_preferences = _routed("set_preferences")
+    set_last_job_url = _routed("set_last_job_url")
+    set_active = _routed("set_active")
+    mark_unreachable = _routed("mark_unreachable")
+
+    add_applied = _routed("add_applied")
+    list_applied = _routed("list_applied")
+    count_applied = _routed("count_applied")
+    remove_applied = _routed("remove_applied")
+    remove_all_applied = _routed("remove_all_applied")
+    import_applied = _routed("import_applied")
+
+    def export_applied(self, user_id, batch=500):
+        return self._shard(user_id).export_applied(user_id, batch)
+
+    search_applied = _routed("search_applied")
+
+    async def active_profiles(self, partition=None):
+        return await self._fan_out("active_profiles", partition)
+
+    async def active_applied(self, partition=None):
+        return await self._fan_out("active_applied", partition)
+
+    get_status = _routed("get_status")
+    log_action = _routed("log_action")
+
+    async def weekly_activity(self, week, partition=None):
+        return await self._fan_out("weekly_activity", partition, week)
+
+    record_heartbeat = _global("record_heartbeat")
+    record_startup = _global("record_startup")
+    count_startups_since = _global("count_startups_since")
+
+    acquire_lease = _global("acquire_lease")
+    release_lease = _global("release_lease")
+    create_work_partitions = _global("create_work_partitions")
+    claim_partition = _global("claim_partition")
+    complete_partition = _global("complete_partition")
+    renew_claim = _global("renew_claim")
+    release_partition = _global("release_partition")
+    unfinished_partitions = _global("unfinished_partitions")
+    unfinished_runs = _global("unfinished_runs")
+
+# ==========================
+# FACTORY
+# ==========================
+
+def create_storage():
+    if STORAGE_BACKEND == "postgres":
+        # asyncpg is only needed when this backend is selected
+        from storage_pg import PostgresStorage
+        return PostgresStorage()
+
+    if STORAGE_BACKEND == "sqlite":
+        if SHARD_COUNT > 1:
+            return ShardedSQLiteStorage()
+        return SQLiteStorage()
+
+    raise RuntimeError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
@@ -0,0 +1,756 @@
+import asyncio
+import itertools
+import os
+import time
+from datetime import date, datetime, timezone
+
+import asyncpg
+
+import tracing
+from storage import PROFILE_COLUMNS, Profile, Storage, normalize_name, search_terms
+
+# ==========================
+# CONFIG
+# ==========================
+
+DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://localhost/jobs")
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", "2"))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", "10"))
+
+# asyncpg prepares every parameterised query on first use and keeps it in a
+# per-connection LRU cache, so repeated statements skip parse/plan.
+PG_STATEMENT_CACHE = int(os.getenv("PG_STATEMENT_CACHE", "256"))
+
+INTERNED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS companies (
+    id BIGSERIAL PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS companies_name_key ON companies (lower(name));
+
+CREATE TABLE IF NOT EXISTS roles (
+    id BIGSERIAL PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS roles_name_key ON roles (lower(name));
+"""
+
+SCHEMA = INTERNED_SCHEMA + """
+CREATE TABLE IF NOT EXISTS user_skills (
+    user_id BIGINT PRIMARY KEY,
+    skills TEXT,
+    location TEXT DEFAULT 'india',
+    exp_min INTEGER DEFAULT 0,
+    exp_max INTEGER DEFAULT 30,
+    work_mode TEXT,
+    active INTEGER DEFAULT 1,
+    last_job_url TEXT
+);
+
+ALTER TABLE user_skills ADD COLUMN IF NOT EXISTS reachable INTEGER DEFAULT 1;
+ALTER TABLE user_skills ADD COLUMN IF NOT EXISTS unreachable_reason TEXT;
+ALTER TABLE user_skills ADD COLUMN IF NOT EXISTS unreachable_at TIMESTAMPTZ;
+CREATE INDEX IF NOT EXISTS user_skills_deliverable
+    ON user_skills (user_id) WHERE active = 1 AND reachable = 1;
+
+CREATE TABLE IF NOT EXISTS applied_jobs (
+    user_id BIGINT NOT NULL,
+    company_id BIGINT NOT NULL REFERENCES companies(id),
+    role_id BIGINT NOT NULL REFERENCES roles(id),
+    applied_at TIMESTAMPTZ,
+    followup_after INTEGER DEFAULT 5,
+    link TEXT,
+    followup_due_at TIMESTAMPTZ,
+    UNIQUE(user_id, company_id, role_id)
+);
+
+ALTER TABLE applied_jobs ADD COLUMN IF NOT EXISTS followup_due_at TIMESTAMPTZ;
+CREATE INDEX IF NOT EXISTS applied_jobs_due ON applied_jobs (user_id, followup_due_at);
+
+-- /search: weighted tsvector (company A, role B, link C) kept by trigger
+ALTER TABLE applied_jobs ADD COLUMN IF NOT EXISTS search tsvector;
+CREATE INDEX IF NOT EXISTS applied_jobs_search ON applied_jobs USING GIN (search);
+
+CREATE OR REPLACE FUNCTION applied_jobs_search_vector(BIGINT, BIGINT, TEXT)
+RETURNS tsvector LANGUAGE sql STABLE AS $$
+    SELECT setweight(to_tsvector('simple', coalesce((SELECT name FROM companies WHERE id = $1), '')), 'A')
+        || setweight(to_tsvector('simple', coalesce((SELECT name FROM roles WHERE id = $2), '')), 'B')
+        -- split URLs into words; the default parser keeps them whole
+        || setweight(to_tsvector('simple', regexp_replace(coalesce($3, ''), '[^[:alnum:]]+', ' ', 'g')), 'C')
+$$;
+
+CREATE OR REPLACE FUNCTION applied_jobs_search_update() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search := applied_jobs_search_vector(NEW.company_id, NEW.role_id, NEW.link);
+    RETURN NEW;
+END
+$$;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'applied_jobs_search') THEN
+        CREATE TRIGGER applied_jobs_search
+        BEFORE INSERT OR UPDATE OF company_id, role_id, link ON applied_jobs
+        FOR EACH ROW EXECUTE FUNCTION applied_jobs_search_update();
+    END IF;
+END
+$$;
+
+CREATE TABLE IF NOT EXISTS job_actions (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    action TEXT NOT NULL,
+    action_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS user_activity (
+    user_id BIGINT PRIMARY KEY,
+    applied_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS weekly_activity (
+    week DATE NOT NULL,
+    user_id BIGINT NOT NULL,
+    action TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (week, user_id, action)
+);
+
+CREATE TABLE IF NOT EXISTS bot_health (
+    id INTEGER PRIMARY KEY,
+    last_heartbeat TIMESTAMPTZ
+);
+
+CREATE TABLE IF NOT EXISTS crash_log (
+    id BIGSERIAL PRIMARY KEY,
+    occurred_at TIMESTAMPTZ
+);
+
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at DOUBLE PRECISION NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS work_partitions (
+    run_id TEXT NOT NULL,
+    part INTEGER NOT NULL,
+    owner TEXT,
+    claimed_at DOUBLE PRECISION,
+    done INTEGER DEFAULT 0,
+    created_at DOUBLE PRECISION,
+    PRIMARY KEY (run_id, part)
+);
+"""
+
+# Databases created before company/role interning
+LEGACY_MIGRATION = r"""
+ALTER TABLE applied_jobs RENAME TO applied_jobs_legacy;
+ALTER TABLE applied_jobs_legacy
+    DROP CONSTRAINT IF EXISTS applied_jobs_user_id_company_role_key;
+
+UPDATE applied_jobs_legacy
+SET company = regexp_replace(btrim(company), '\s+', ' ', 'g'),
+    role = regexp_replace(btrim(role), '\s+', ' ', 'g');
+
+INSERT INTO companies (name)
+SELECT DISTINCT ON (lower(company)) company
+FROM applied_jobs_legacy WHERE company <> ''
+ON CONFLICT DO NOTHING;
+
+INSERT INTO roles (name)
+SELECT DISTINCT ON (lower(role)) role
+FROM applied_jobs_legacy WHERE role <> ''
+ON CONFLICT DO NOTHING;
+
+CREATE TABLE applied_jobs (
+    user_id BIGINT NOT NULL,
+    company_id BIGINT NOT NULL REFERENCES companies(id),
+    role_id BIGINT NOT NULL REFERENCES roles(id),
+    applied_at TIMESTAMPTZ,
+    followup_after INTEGER DEFAULT 5,
+    link TEXT,
+    UNIQUE(user_id, company_id, role_id)
+);
+
+INSERT INTO applied_jobs
+(user_id, company_id, role_id, applied_at, followup_after, link)
+SELECT a.user_id, c.id, r.id, a.applied_at, a.followup_after, a.link
+FROM applied_jobs_legacy a
+JOIN companies c ON lower(c.name) = lower(a.company)
+JOIN roles r ON lower(r.name) = lower(a.role)
+ORDER BY a.applied_at
+ON CONFLICT DO NOTHING;
+
+DROP TABLE applied_jobs_legacy;
+"""
+
+# First start with the activity tables: derive them from applied_jobs
+ACTIVITY_BACKFILL = """
+UPDATE applied_jobs
+SET followup_due_at = applied_at + make_interval(days => COALESCE(followup_after, 5))
+WHERE followup_due_at IS NULL;
+
+INSERT INTO user_activity (user_id, applied_count)
+SELECT user_id, COUNT(*) FROM applied_jobs GROUP BY user_id;
+
+INSERT INTO job_actions (user_id, action, action_at)
+SELECT user_id, 'apply', applied_at FROM applied_jobs
+WHERE applied_at IS NOT NULL;
+
+INSERT INTO weekly_activity (week, user_id, action, count)
+SELECT date_trunc('week', action_at AT TIME ZONE 'UTC')::date, user_id, action, COUNT(*)
+FROM job_actions
+GROUP BY 1, 2, 3;
+"""
+
+# First start with the search column: index the rows already there
+SEARCH_BACKFILL = """
+UPDATE applied_jobs
+SET search = applied_jobs_search_vector(company_id, role_id, link)
+WHERE search IS NULL;
+"""
+
+# Log one action and bump its weekly rollup in the same statement
+LOG_ACTION = """
+WITH logged AS (
+    INSERT INTO job_actions (user_id, action, action_at)
+    VALUES ($1, $2, $3)
+    RETURNING user_id, action, action_at
+)
+INSERT INTO weekly_activity (week, user_id, action, count)
+SELECT date_trunc('week', action_at AT TIME ZONE 'UTC')::date, user_id, action, 1
+FROM logged
+ON CONFLICT (week, user_id, action)
+DO UPDATE SET count = weekly_activity.count + 1
+"""
+
+# Same, for `$4` identical actions at once (e.g. clearing the whole list)
+LOG_ACTIONS = """
+WITH logged AS (
+    INSERT INTO job_actions (user_id, action, action_at)
+    SELECT $1::bigint, $2::text, $3::timestamptz FROM generate_series(1, $4::int)
+    RETURNING user_id, action, action_at
+)
+INSERT INTO weekly_activity (week, user_id, action, count)
+SELECT date_trunc('week', action_at AT TIME ZONE 'UTC')::date, user_id, action, COUNT(*)
+FROM logged
+GROUP BY 1, 2, 3
+ON CONFLICT (week, user_id, action)
+DO UPDATE SET count = weekly_activity.count + excluded.count
+"""
+
+def _rowcount(status):
+    # asyncpg returns the command tag, e.g. "DELETE 3"
+    return int(status.split()[-1])
+
+def _ts(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+# ==========================
+# POSTGRES
+# ==========================
+
+class PostgresStorage(Storage):
+
+    def __init__(self, dsn=DATABASE_URL):
+        self.dsn = dsn
+        self.pool = None
+
+    async def _init_connection(self, con):
+        if tracing.ENABLED:
+            con.add_query_logger(self._trace_query)
+
+    @staticmethod
+    def _trace_query(record):
+        # Called via call_soon from the querying task, so its span is current
+        end_ns = time.time_ns()
+        tracing.record(
+            f"sql {record.query.split(None, 1)[0].upper()}",
+            end_ns - int(record.elapsed * 1e9), end_ns,
+            error=repr(record.exception) if record.exception else None,
+            **{"db.statement": " ".join(record.query.split())[:500]}
+        )
+
+    async def connect(self):
+        self.pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=PG_POOL_MIN,
+            max_size=PG_POOL_MAX,
+            statement_cache_size=PG_STATEMENT_CACHE,
+            init=self._init_connection
+        )
+        async with self.pool.acquire() as con:
+            async with con.transaction():
+                legacy = await con.fetchval("""
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'applied_jobs' AND column_name = 'company'
+                """)
+                fresh_activity = await con.fetchval(
+                    "SELECT to_regclass('job_actions') IS NULL"
+                )
+                fresh_search = not await con.fetchval("""
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'applied_jobs' AND column_name = 'search'
+                """)
+                if legacy:
+                    await con.execute(INTERNED_SCHEMA)
+                    await con.execute(LEGACY_MIGRATION)
+                await con.execute(SCHEMA)
+                if fresh_activity:
+                    await con.execute(ACTIVITY_BACKFILL)
+                if fresh_search:
+                    await con.execute(SEARCH_BACKFILL)
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    # ---- user_skills ----
+
+    async def activate_user(self, user_id):
+        await self.pool.execute("""
+            INSERT INTO user_skills (user_id, active)
+            VALUES ($1, 1)
+            ON CONFLICT (user_id) DO UPDATE SET
+                active = 1, reachable = 1, unreachable_reason = NULL
+        """, user_id)
+
+    async def get_profile(self, user_id):
+        row = await self.pool.fetchrow(
+            f"SELECT {PROFILE_COLUMNS} FROM user_skills WHERE user_id = $1",
+            user_id
+        )
+        return Profile(*row) if row else None
+
+    async def upsert_skills(self, user_id, skills):
+        await self.pool.execute("""
+            INSERT INTO user_skills (user_id, skills, active)
+            VALUES ($1, $2, 1)
+            ON CONFLICT (user_id)
+            DO UPDATE SET skills = excluded.skills
+        """, user_id, skills)
+
+    async def update_skills(self, user_id, skills):
+        status = await self.pool.execute(
+            "UPDATE user_skills SET skills = $1 WHERE user_id = $2",
+            skills, user_id
+        )
+        return _rowcount(status) > 0
+
+    async def set_preferences(self, user_id, location, exp_min, exp_max, work_mode):
+        status = await self.pool.execute("""
+            UPDATE user_skills
+            SET location = $1, exp_min = $2, exp_max = $3, work_mode = $4
+            WHERE user_id = $5
+        """, location, exp_min, exp_max, work_mode, user_id)
+        return _rowcount(status) > 0
+
+    async def set_last_job_url(self, user_id, url):
+        await self.pool.execute(
+            "UPDATE user_skills SET last_job_url = $1 WHERE user_id = $2",
+            url, user_id
+        )
+
+    async def set_active(self, user_id, active):
+        await self.pool.execute(
+            "UPDATE user_skills SET active = $1 WHERE user_id = $2",
+            1 if active else 0, user_id
+        )
+
+    async def active_profiles(self, partition=None):
+        sql = (
+            f"SELECT {PROFILE_COLUMNS} FROM user_skills "
+            "WHERE active = 1 AND reachable = 1"
+        )
+        args = ()
+        if partition:
+            sql += " AND abs(user_id) % $1 = $2"
+            args = (partition[1], partition[0])
+        rows = await self.pool.fetch(sql, *args)
+        return [Profile(*row) for row in rows]
+
+    async def mark_unreachable(self, user_id, reason, at):
+        await self.pool.execute("""
+            UPDATE user_skills
+            SET reachable = 0, unreachable_reason = $1, unreachable_at = $2
+            WHERE user_id = $3
+        """, reason, _ts(at), user_id)
+
+    # ---- applied_jobs ----
+
+    async def _intern(self, con, table, name):
+        # Returns the existing id for any casing of `name`, or a new one
+        return await con.fetchval(f"""
+            INSERT INTO {table} (name) VALUES ($1)
+            ON CONFLICT ((lower(name))) DO UPDATE SET name = {table}.name
+            RETURNING id
+        """, name)
+
+    async def add_applied(self, user_id, company, role, applied_at, followup_after, link):
+        async with self.pool.acquire() as con:
+            async with con.transaction():
+                company_id = await self._intern(con, "companies", normalize_name(company))
+                role_id = await self._intern(con, "roles", normalize_name(role))
+                status = await con.execute("""
+                    INSERT INTO applied_jobs
+                    (user_id, company_id, role_id, applied_at, followup_after, link,
+                     followup_due_at)
+                    VALUES ($1, $2, $3, $4::timestamptz, $5::int, $6,
+                            $4::timestamptz + make_interval(days => $5::int))
+                    ON CONFLICT DO NOTHING
+                """, user_id, company_id, role_id, _ts(applied_at), followup_after, link)
+                added = _rowcount(status) > 0
+
+                # Rollups are maintained on the write path, in this transaction
+                if added:
+                    await con.execute("""
+                        INSERT INTO user_activity (user_id, applied_count)
+                        VALUES ($1, 1)
+                        ON CONFLICT (user_id)
+                        DO UPDATE SET applied_count = user_activity.applied_count + 1
+                    """, user_id)
+                    await con.execute(LOG_ACTION, user_id, "apply", _ts(applied_at))
+        return added
+
+    async def list_applied(self, user_id):
+        rows = await self.pool.fetch("""
+            SELECT c.name AS company, r.name AS role,
+                   a.applied_at, a.followup_after, a.link
+            FROM applied_jobs a
+            JOIN companies c ON c.id = a.company_id
+            JOIN roles r ON r.id = a.role_id
+            WHERE a.user_id = $1
+            ORDER BY a.applied_at DESC
+        """, user_id)
+        return [
+            (r["company"], r["role"], _iso(r["applied_at"]), r["followup_after"], r["link"])
+            for r in rows
+        ]
+
+    async def import_applied(self, user_id, rows, batch=500):
+        # One statement per batch over unnest() arrays rather than
+        # executemany: RETURNING tells inserts from updates, which the
+        # user_activity / job_actions rollups need
+        rows_iter = iter(rows)
+        added = updated = 0
+
+        async with self.pool.acquire() as con:
+            async with con.transaction():
+                while True:
+                    # Parsing the upload happens off the event loop
+                    chunk = await asyncio.to_thread(
+                        lambda: list(itertools.islice(rows_iter, batch))
+                    )
+                    if not chunk:
+                        break
+
+                    # ON CONFLICT can't touch one row twice in a statement,
+                    # so repeats within a batch are folded in here the way
+                    # the upsert would: names and applied_at from the first,
+                    # followup_after from the last, link unless it's empty.
+                    # Each repeat counts as an update, as on SQLite.
+                    unique = {}
+                    for company, role, applied_at, days, link in chunk:
+                        company, role = normalize_name(company), normalize_name(role)
+                        key = (company.lower(), role.lower())
+                        if key in unique:
+                            first = unique[key]
+                            unique[key] = (*first[:3], days, link or first[4])
+                            updated += 1
+                        else:
+                            unique[key] = (company, role, _ts(applied_at), days, link)
+                    companies, roles, applied, days, links = map(list, zip(*unique.values()))
+
+                    for table, names in (("companies", companies), ("roles", roles)):
+                        await con.execute(f"""
+                            INSERT INTO {table} (name)
+                            SELECT DISTINCT ON (lower(n)) n
+                            FROM unnest($1::text[]) WITH ORDINALITY AS u(n, i)
+                            ORDER BY lower(n), i
+                            ON CONFLICT ((lower(name))) DO NOTHING
+                        """, names)
+
+                    results = await con.fetch("""
+                        INSERT INTO applied_jobs
+                        (user_id, company_id, role_id, applied_at, followup_after,
+                         link, followup_due_at)
+                        SELECT $1, c.id, r.id, t.applied_at, t.days, t.link,
+                               t.applied_at + make_interval(days => t.days)
+                        FROM unnest($2::text[], $3::text[], $4::timestamptz[],
+                                    $5::int[], $6::text[])
+                             AS t(company, role, applied_at, days, link)
+                        JOIN companies c ON lower(c.name) = lower(t.company)
+                        JOIN roles r ON lower(r.name) = lower(t.role)
+                        ON CONFLICT (user_id, company_id, role_id) DO UPDATE SET
+                            followup_after = EXCLUDED.followup_after,
+                            link = COALESCE(EXCLUDED.link, applied_jobs.link),
+                            followup_due_at = applied_jobs.applied_at
+                                + make_interval(days => EXCLUDED.followup_after)
+                        RETURNING (xmax = 0) AS inserted, applied_at
+                    """, user_id, companies, roles, applied, days, links)
+
+                    inserted = [r["applied_at"] for r in results if r["inserted"]]
+                    added += len(inserted)
+                    updated += len(results) - len(inserted)
+
+                    if inserted:
+                        await con.executemany(
+                            LOG_ACTION, [(user_id, "apply", at) for at in inserted]
+                        )
+
+                if added:
+                    await con.execute("""
+                        INSERT INTO user_activity (user_id, applied_count)
+                        VALUES ($1, $2)
+                        ON CONFLICT (user_id)
+                        DO UPDATE SET applied_count = user_activity.applied_count + $2
+                    """, user_id, added)
+
+        return added, updated
+
+    async def export_applied(self, user_id, batch=500):
+        # Server-side cursor: rows arrive `batch` at a time
+        async with self.pool.acquire() as con:
+            async with con.transaction():
+                cursor = await con.cursor("""
+                    SELECT c.name, r.name, a.applied_at, a.followup_after, a.link
+                    FROM applied_jobs a
+                    JOIN companies c ON c.id = a.company_id
+                    JOIN roles r ON r.id = a.role_id
+                    WHERE a.user_id = $1
+                    ORDER BY a.applied_at
+                """, user_id)
+                while rows := await cursor.fetch(batch):
+                    yield [
+                        (r[0], r[1], _iso(r[2]), r[3], r[4]) for r in rows
+                    ]
+
+    async def count_applied(self, user_id):
+        return await self.pool.fetchval(
+            "SELECT COUNT(*) FROM applied_jobs WHERE user_id = $1",
+            user_id
+        )
+
+    async def remove_applied(self, user_id, company, role):
+        async with self.pool.acquire() as con:
+            async with con.transaction():
+                # Both name lookups hit the lower(name) unique indexes
+                removed = _rowcount(await con.execute("""
+                    DELETE FROM applied_jobs
+                    WHERE user_id = $1
+                      AND company_id = (SELECT id FROM companies WHERE lower(name) = lower($2))
+                      AND role_id = (SELECT id FROM roles WHERE lower(name) = lower($3))
+                """, user_id, normalize_name(company), normalize_name(role)))
+                if removed:
+                    await self._adjust_applied_count(con, user_id, -removed)
+                    await con.execute(
+                        LOG_ACTION, user_id, "ignore", datetime.now(timezone.utc)
+                    )
+        return removed
+
+    async def remove_all_applied(self, user_id):
+        async with self.pool.acquire() as con:
+            async with con.transaction():
+                removed = _rowcount(await con.execute(
+                    "DELETE FROM applied_jobs WHERE user_id = $1",
+                    user_id
+                ))
+                if removed:
+                    await self._adjust_applied_count(con, user_id, -removed)
+                    await con.execute(
+                        LOG_ACTIONS, user_id, "ignore", datetime.now(timezone.utc), removed
+                    )
+        return removed
+
+    async def _adjust_applied_count(self, con, user_id, delta):
+        await con.execute("""
+            UPDATE user_activity SET applied_count = applied_count + $2
+            WHERE user_id = $1
+        """, user_id, delta)
+
+    async def active_applied(self, partition=None):
+        sql = """
+            SELECT a.user_id, c.name AS company, r.name AS role, a.applied_at
+            FROM applied_jobs a
+            JOIN user_skills u ON a.user_id = u.user_id
+            JOIN companies c ON c.id = a.company_id
+            JOIN roles r ON r.id = a.role_id
+            WHERE u.active = 1 AND u.reachable = 1
+        """
+        args = ()
+        if partition:
+            sql += " AND abs(a.user_id) % $1 = $2"
+            args = (partition[1], partition[0])
+        rows = await self.pool.fetch(sql, *args)
+        return [
+            (r["user_id"], r["company"], r["role"], _iso(r["applied_at"]))
+            for r in rows
+        ]
+
+    async def search_applied(self, user_id, query, limit, offset=0):
+        terms = search_terms(query)
+        if not terms:
+            return []
+
+        # Every term as a prefix, all required; answered by the GIN index
+        rows = await self.pool.fetch("""
+            SELECT c.name AS company, r.name AS role,
+                   a.applied_at, a.followup_after, a.link
+            FROM applied_jobs a
+            JOIN companies c ON c.id = a.company_id
+            JOIN roles r ON r.id = a.role_id,
+                 to_tsquery('simple', $2) AS q
+            WHERE a.user_id = $1 AND a.search @@ q
+            ORDER BY ts_rank(a.search, q) DESC, a.applied_at DESC
+            LIMIT $3 OFFSET $4
+        """, user_id, " & ".join(f"{term}:*" for term in terms), limit, offset)
+        return [
+            (r["company"], r["role"], _iso(r["applied_at"]), r["followup_after"], r["link"])
+            for r in rows
+        ]
+
+    # ---- job_actions / activity rollups ----
+
+    async def get_status(self, user_id, now):
+        row = await self.pool.fetchrow(f"""
+            SELECT {", ".join("u." + c for c in PROFILE_COLUMNS.split(", "))},
+                   COALESCE(a.applied_count, 0) AS applied_count,
+                   (SELECT COUNT(*) FROM applied_jobs d
+                    WHERE d.user_id = u.user_id
+                      AND d.followup_due_at <= $2) AS due_count
+            FROM user_skills u
+            LEFT JOIN user_activity a ON a.user_id = u.user_id
+            WHERE u.user_id = $1
+        """, user_id, _ts(now))
+        if not row:
+            return None
+        return Profile(*list(row.values())[:-2]), row["applied_count"], row["due_count"]
+
+    async def log_action(self, user_id, action, at):
+        await self.pool.execute(LOG_ACTION, user_id, action, _ts(at))
+
+    async def weekly_activity(self, week, partition=None):
+        # Summary recipients only (user_skills_deliverable partial index)
+        sql = """
+            SELECT w.user_id, w.action, w.count
+            FROM weekly_activity w
+            JOIN user_skills u ON u.user_id = w.user_id
+                AND u.active = 1 AND u.reachable = 1
+            WHERE w.week = $1
+        """
+        args = (date.fromisoformat(week),)
+        if partition:
+            sql += " AND abs(w.user_id) % $2 = $3"
+            args += (partition[1], partition[0])
+        rows = await self.pool.fetch(sql, *args)
+        return [tuple(r) for r in rows]
+
+    # ---- bot_health / crash_log ----
+
+    async def record_heartbeat(self, at):
+        await self.pool.execute("""
+            INSERT INTO bot_health (id, last_heartbeat)
+            VALUES (1, $1)
+            ON CONFLICT (id) DO UPDATE SET last_heartbeat = excluded.last_heartbeat
+        """, _ts(at))
+
+    async def record_startup(self, at):
+        await self.pool.execute(
+            "INSERT INTO crash_log (occurred_at) VALUES ($1)",
+            _ts(at)
+        )
+
+    async def count_startups_since(self, since):
+        return await self.pool.fetchval(
+            "SELECT COUNT(*) FROM crash_log WHERE occurred_at >= $1",
+            _ts(since)
+        )
+
+    # ---- leases / work partitions ----
+
+    async def acquire_lease(self, name, holder, ttl, now):
+        owner = await self.pool.fetchval("""
+            INSERT INTO leases (name, holder, expires_at)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (name) DO UPDATE
+            SET holder = excluded.holder, expires_at = excluded.expires_at
+            WHERE leases.holder = excluded.holder OR leases.expires_at < $4
+            RETURNING holder
+        """, name, holder, now + ttl, now)
+        return owner == holder
+
+    async def release_lease(self, name, holder):
+        await self.pool.execute(
+            "DELETE FROM leases WHERE name = $1 AND holder = $2",
+            name, holder
+        )
+
+    async def create_work_partitions(self, run_id, count, now):
+        async with self.pool.acquire() as con:
+            async with con.transaction():
+                await con.executemany("""
+                    INSERT INTO work_partitions (run_id, part, created_at)
+                    VALUES ($1, $2, $3)
+                    ON CONFLICT DO NOTHING
+                """, [(run_id, part, now) for part in range(count)])
+                # Finished runs are only kept for a day
+                await con.execute(
+                    "DELETE FROM work_partitions WHERE created_at < $1",
+                    now - 86400
+                )
+
+    async def claim_partition(self, run_id, holder, now, stale_before):
+        # SKIP LOCKED lets replicas claim different rows concurrently
+        return await self.pool.fetchval("""
+            UPDATE work_partitions
+            SET owner = $1, claimed_at = $2
+            WHERE run_id = $3 AND part = (
+                SELECT part FROM work_partitions
+                WHERE run_id = $3 AND done = 0
+                  AND (owner IS NULL OR claimed_at < $4)
+                ORDER BY part
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING part
+        """, holder, now, run_id, stale_before)
+
+    async def complete_partition(self, run_id, part, holder):
+        await self.pool.execute("""
+            UPDATE work_partitions SET done = 1
+            WHERE run_id = $1 AND part = $2 AND owner = $3
+        """, run_id, part, holder)
+
+    async def renew_claim(self, run_id, part, holder, now):
+        return _rowcount(await self.pool.execute("""
+            UPDATE work_partitions SET claimed_at = $4
+            WHERE run_id = $1 AND part = $2 AND owner = $3 AND done = 0
+        """, run_id, part, holder, now)) > 0
+
+    async def release_partition(self, run_id, part, holder):
+        await self.pool.execute("""
+            UPDATE work_partitions SET owner = NULL, claimed_at = NULL
+            WHERE run_id = $1 AND part = $2 AND owner = $3 AND done = 0
+        """, run_id, part, holder)
+
+    async def unfinished_partitions(self, run_id):
+        return await self.pool.fetchval(
+            "SELECT COUNT(*) FROM work_partitions WHERE run_id = $1 AND done = 0",
+            run_id
+        )
+
+    async def unfinished_runs(self, since):
+        rows = await self.pool.fetch("""
+            SELECT run_id, COUNT(*) AS parts FROM work_partitions
+            WHERE created_at >= $1
+            GROUP BY run_id
+            HAVING COUNT(*) FILTER (WHERE done = 0) > 0
+            ORDER BY MIN(created_at)
+        """, since)
+        return [(r["run_id"], r["parts"]) for r in rows]
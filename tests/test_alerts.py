@@ -0,0 +1,141 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import alerts
+import ratelimit
+from alerts import CRITICAL, ERROR, WARNING, Alerter
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+class FakeBot:
+
+    def __init__(self):
+        self.sent = []
+        self.fail = False
+        self.during = None  # coroutine function run mid-send
+
+    async def send_message(self, chat_id, text):
+        if self.during:
+            await self.during()
+        if self.fail:
+            raise RuntimeError("telegram down")
+        self.sent.append(text)
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # Only alerts' and the limiter's view of time; asyncio keeps the real clock
+    monkeypatch.setattr(alerts, "time", SimpleNamespace(
+        time=clock, monotonic=clock, strftime=time.strftime, gmtime=time.gmtime
+    ))
+    monkeypatch.setattr(ratelimit, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+@pytest.fixture
+def alerter(clock):
+    return Alerter(chat_id=1)
+
+# ==========================
+# DEDUP
+# ==========================
+
+def test_repeats_become_one_digest_line(alerter, clock):
+    bot = FakeBot()
+
+    async def main():
+        for _ in range(3):
+            await alerter.alert(bot, "backup", "Backup failed", WARNING)
+            clock.now += 60
+        await alerter.alert(bot, "backup", "Backup failed again", ERROR)
+        await alerter.alert(bot, "heartbeat", "No heartbeat", WARNING)
+        # Nothing goes out before the digest
+        assert bot.sent == []
+
+        await alerter.flush(bot)
+        await alerter.flush(bot)  # nothing pending: no message
+
+    asyncio.run(main())
+    assert len(bot.sent) == 1
+    digest = bot.sent[0]
+    assert digest.startswith("🚨 BOT ALERTS (2)")
+    # Worst severity and latest message win; highest severity listed first
+    assert "ERROR (×4 since" in digest and "Backup failed again" in digest
+    assert digest.index("ERROR") < digest.index("WARNING")
+    assert not alerter.pending
+
+# ==========================
+# CRITICAL COOLDOWN
+# ==========================
+
+def test_critical_bypasses_digest_once_per_cooldown(alerter, clock):
+    bot = FakeBot()
+
+    async def main():
+        await alerter.alert(bot, "db", "Database down", CRITICAL)
+        assert len(bot.sent) == 1
+
+        # Within the cooldown it waits for the digest like anything else
+        clock.now += alerts.ALERT_CRITICAL_COOLDOWN - 1
+        await alerter.alert(bot, "db", "Database still down", CRITICAL)
+        assert len(bot.sent) == 1 and "db" in alerter.pending
+
+        clock.now += 1
+        await alerter.alert(bot, "db", "Database still down", CRITICAL)
+        assert len(bot.sent) == 2 and "×2" in bot.sent[1]
+
+    asyncio.run(main())
+
+# ==========================
+# BUDGET
+# ==========================
+
+def test_over_budget_stays_pending(alerter, clock):
+    bot = FakeBot()
+    burst = int(alerts.ALERT_BURST)
+
+    async def main():
+        for i in range(burst + 1):
+            await alerter.alert(bot, f"f{i}", "boom")
+            await alerter.flush(bot)
+        assert len(bot.sent) == burst
+        assert list(alerter.pending) == [f"f{burst}"]
+
+        # Goes out with the next digest once the budget refilled
+        clock.now += 3600 / alerts.ALERT_PER_HOUR
+        await alerter.alert(bot, "later", "boom")
+        await alerter.flush(bot)
+
+    asyncio.run(main())
+    assert len(bot.sent) == burst + 1
+    assert "(2)" in bot.sent[-1]
+
+def test_failed_send_is_requeued_and_merged(alerter, clock):
+    bot = FakeBot()
+
+    async def raised_meanwhile():
+        clock.now += 60
+        await alerter.alert(bot, "backup", "Backup failed")
+
+    async def main():
+        await alerter.alert(bot, "backup", "Backup failed")
+        bot.fail, bot.during = True, raised_meanwhile
+        await alerter.flush(bot)
+        # The failed one and the one raised during the send, merged
+        _, _, count, first, _ = alerter.pending["backup"]
+        assert count == 2 and first == clock.now - 60
+
+        bot.fail, bot.during = False, None
+        await alerter.flush(bot)
+
+    asyncio.run(main())
+    assert len(bot.sent) == 1
+    assert "×2 since" in bot.sent[0]
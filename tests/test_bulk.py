@@ -0,0 +1,107 @@
+import asyncio
+import io
+import json
+
+import pytest
+
+import bulk
+from bulk import ImportReport
+
+def _parse(text, fmt):
+    report = ImportReport()
+    rows = list(bulk.parse(io.BytesIO(text.encode("utf-8")), fmt, report))
+    return rows, report
+
+# ==========================
+# FOLLOWUP_AFTER
+# ==========================
+
+@pytest.mark.parametrize("record, days", [
+    ({}, 5),
+    ({"followup_after": ""}, 5),
+    ({"followup_after": "  "}, 5),
+    ({"followup_after": None, "days": "3"}, 3),
+    ({"followup_after": 0}, 0),
+    ({"followup_after": "7"}, 7),
+    ({"followup_after": 7.0}, 7),
+    ({"followup_after": bulk.FOLLOWUP_MAX_DAYS}, bulk.FOLLOWUP_MAX_DAYS),
+])
+def test_followup_after(record, days):
+    assert bulk._followup_after(record) == days
+
+@pytest.mark.parametrize("value", [
+    -1, bulk.FOLLOWUP_MAX_DAYS + 1, "1e9", "abc", 2.5, True, [5],
+])
+def test_followup_after_rejects(value):
+    with pytest.raises(ValueError):
+        bulk._followup_after({"followup_after": value})
+
+# ==========================
+# PARSE
+# ==========================
+
+def test_parse_csv():
+    rows, report = _parse(
+        "\ufeffCompany , Role,applied_at,followup_after,link\n"
+        "Amazon,SRE,2024-01-02,7,https://x/1\n"
+        ",SRE,,,\n"
+        "Google,SRE,yesterday,,\n"
+        "Meta,Data Engineer,2024-01-03T10:00:00Z,,\n",
+        "csv"
+    )
+    assert rows == [
+        ("Amazon", "SRE", "2024-01-02T00:00:00+00:00", 7, "https://x/1"),
+        ("Meta", "Data Engineer", "2024-01-03T10:00:00+00:00", 5, None),
+    ]
+    # Skips point at the file's own line numbers
+    assert report.rows == 2 and report.skipped_count == 2
+    assert report.skipped == [
+        (3, "company and role are required"),
+        (4, "applied_at must be an ISO date"),
+    ]
+
+def test_parse_jsonl_and_json():
+    lines = [
+        json.dumps({"company": "Amazon", "role": "SRE", "days": 3}),
+        "",
+        "{not json",
+        json.dumps({"company": "Google", "role": "SRE", "followup_after": 999}),
+    ]
+    rows, report = _parse("\n".join(lines), "jsonl")
+    assert [(r[0], r[3]) for r in rows] == [("Amazon", 3)]
+    assert [where for where, _ in report.skipped] == [3, 4]
+
+    rows, report = _parse(json.dumps([{"company": "Amazon", "role": "SRE"}, 5]), "json")
+    assert len(rows) == 1 and report.skipped == [(2, "not an object")]
+
+    with pytest.raises(ValueError):
+        _parse(json.dumps({"company": "Amazon"}), "json")
+
+def test_parse_stops_at_max_rows(monkeypatch):
+    monkeypatch.setattr(bulk, "IMPORT_MAX_ROWS", 2)
+    text = "company,role\n" + "".join(f"C{i},R\n" for i in range(5))
+    rows, report = _parse(text, "csv")
+    assert len(rows) == 2 and report.truncated
+
+# ==========================
+# ROUND TRIP
+# ==========================
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl"])
+def test_export_reimports(fmt):
+    rows = [
+        ("Amazon", "SRE", "2024-01-02T00:00:00+00:00", 7, "https://x/1"),
+        ("Google, Inc.", "SRE", "2024-01-03T00:00:00+00:00", 0, None),
+    ]
+
+    async def batches():
+        yield rows[:1]
+        yield rows[1:]
+
+    out = io.BytesIO()
+    assert asyncio.run(bulk.export(batches(), out, fmt)) == 2
+
+    out.seek(0)
+    report = ImportReport()
+    assert list(bulk.parse(out, fmt, report)) == rows
+    assert report.skipped_count == 0
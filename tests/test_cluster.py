@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+import pytest
+
+import cluster
+import storage
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage.backup, "BACKUP_DIR", str(tmp_path / "backups"))
+    monkeypatch.setattr(cluster, "FOLLOWER_DELAY", 0)
+    monkeypatch.setattr(cluster, "CLAIM_TIMEOUT", 0.3)
+    monkeypatch.setattr(cluster, "CLAIM_POLL_INTERVAL", 0.02)
+    db = storage.SQLiteStorage(str(tmp_path / "jobs.db"))
+
+    def run(case):
+        async def main():
+            await db.connect()
+            try:
+                await case(db)
+            finally:
+                await db.close()
+
+        asyncio.run(main())
+
+    return run
+
+def _recorder(seen, slow=(), fail=()):
+    async def handler(partition):
+        part = partition[0]
+        if part in fail:
+            raise RuntimeError(f"partition {part} failed")
+        if part in slow:
+            await asyncio.sleep(1.0)
+        seen.append(part)
+
+    return handler
+
+def test_stale_lease_still_seeds_run(run):
+    # The lease holder died (or came back from a snapshot) before the run
+    async def case(db):
+        await db.acquire_lease("scheduler", "old-pod", 900, time.time())
+        leader = cluster.LeaderElection(db, holder="new-pod")
+
+        seen = []
+        processed = await cluster.run_partitioned(
+            db, leader, "daily_jobs:t", _recorder(seen), partitions=4
+        )
+        assert not leader.is_leader
+        assert processed == 4 and sorted(seen) == [0, 1, 2, 3]
+        assert await db.unfinished_partitions("daily_jobs:t") == 0
+
+    run(case)
+
+def test_dead_claim_is_taken_over(run):
+    async def case(db):
+        now = time.time()
+        await db.create_work_partitions("r", 4, now)
+        assert await db.claim_partition("r", "dead-pod", now, 0) == 0
+
+        seen = []
+        leader = cluster.LeaderElection(db, holder="a")
+        processed = await cluster.run_partitioned(
+            db, leader, "r", _recorder(seen), partitions=4, workers=2
+        )
+        # Bucket 0 waited for the claim to go stale instead of being dropped
+        assert processed == 4 and sorted(seen) == [0, 1, 2, 3]
+
+    run(case)
+
+def test_slow_bucket_is_renewed_not_resent(run):
+    async def case(db):
+        seen = []
+        handler = _recorder(seen, slow={1})
+        replicas = [cluster.LeaderElection(db, holder=h) for h in ("a", "b")]
+
+        # Bucket 1 takes longer than CLAIM_TIMEOUT on whichever replica has it
+        await asyncio.gather(*(
+            cluster.run_partitioned(db, leader, "r", handler, partitions=4)
+            for leader in replicas
+        ))
+        assert sorted(seen) == [0, 1, 2, 3]
+
+    run(case)
+
+def test_failed_bucket_is_released(run):
+    async def case(db):
+        leader = cluster.LeaderElection(db, holder="a")
+        seen = []
+        with pytest.raises(RuntimeError):
+            await cluster.run_partitioned(
+                db, leader, "r", _recorder(seen, fail={0}), partitions=2
+            )
+
+        owner = await db._fetchone(
+            "SELECT owner, done FROM work_partitions WHERE run_id = 'r' AND part = 0"
+        )
+        assert owner == (None, 0)
+
+        # Claimable again right away, e.g. by resume_runs
+        await cluster.run_partitioned(db, leader, "r", _recorder(seen), partitions=2)
+        assert sorted(seen) == [0, 1]
+
+    run(case)
+
+def test_cancelled_bucket_is_released(run):
+    async def case(db):
+        leader = cluster.LeaderElection(db, holder="a")
+        task = asyncio.create_task(cluster.run_partitioned(
+            db, leader, "r", _recorder([], slow={0}), partitions=1
+        ))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert await db.unfinished_runs(0) == [("r", 1)]
+        assert await db.claim_partition("r", "b", time.time(), 0) == 0
+
+    run(case)
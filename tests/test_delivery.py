@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+import delivery
+
+class FakeBot:
+
+    def __init__(self, *errors):
+        # One entry per send_message call: an exception to raise, or None
+        self.errors = list(errors)
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(chat_id)
+        error = self.errors.pop(0) if self.errors else None
+        if error:
+            raise error
+
+class FakeDB:
+
+    def __init__(self):
+        self.unreachable = []
+
+    async def mark_unreachable(self, user_id, reason, at):
+        self.unreachable.append((user_id, reason))
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(delivery.asyncio, "sleep", sleep)
+    return sleeps
+
+# ==========================
+# CLASSIFICATION
+# ==========================
+
+@pytest.mark.parametrize("error, outcome", [
+    (Forbidden("Forbidden: bot was blocked by the user"), "blocked"),
+    (Forbidden("Forbidden: user is deactivated"), "deactivated"),
+    (BadRequest("Chat not found"), "chat_not_found"),
+    (BadRequest("Message is too long"), "error"),
+    (RetryAfter(5), "transient"),
+    (TimedOut(), "transient"),
+    (NetworkError("Connection reset"), "transient"),
+    (ValueError("boom"), "error"),
+])
+def test_classify(error, outcome):
+    assert delivery.classify(error) == outcome
+
+# ==========================
+# SEND
+# ==========================
+
+@pytest.mark.parametrize("error, reason", [
+    (Forbidden("Forbidden: bot was blocked by the user"), "blocked"),
+    (Forbidden("Forbidden: user is deactivated"), "deactivated"),
+    (BadRequest("Chat not found"), "chat_not_found"),
+])
+def test_permanent_failure_marks_unreachable(error, reason, sleeps):
+    bot, db = FakeBot(error), FakeDB()
+    assert not asyncio.run(delivery.send(bot, db, 42, "hi"))
+    assert db.unreachable == [(42, reason)]
+    # Not retried
+    assert bot.sent == [42] and sleeps == []
+
+def test_generic_bad_request_is_not_retried_or_pruned(sleeps):
+    bot, db = FakeBot(BadRequest("Can't parse entities")), FakeDB()
+    assert not asyncio.run(delivery.send(bot, db, 42, "hi"))
+    assert bot.sent == [42] and sleeps == []
+    assert db.unreachable == []
+
+def test_retry_after_is_honoured_once(sleeps):
+    bot, db = FakeBot(RetryAfter(3)), FakeDB()
+    assert asyncio.run(delivery.send(bot, db, 42, "hi"))
+    assert bot.sent == [42, 42] and sleeps == [3]
+
+def test_retry_after_twice_gives_up(sleeps):
+    bot, db = FakeBot(RetryAfter(3), RetryAfter(3)), FakeDB()
+    assert not asyncio.run(delivery.send(bot, db, 42, "hi"))
+    assert bot.sent == [42, 42] and sleeps == [3]
+    assert db.unreachable == []
@@ -0,0 +1,154 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import ratelimit
+from ratelimit import Coalescer, RateLimiter
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # Only ratelimit's view of time; asyncio keeps the real clock
+    monkeypatch.setattr(ratelimit, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+# ==========================
+# TOKEN BUCKET
+# ==========================
+
+def test_burst_then_limited_warns_once(clock):
+    limiter = RateLimiter(burst=3, per_minute=60)
+
+    assert [limiter.allow(1) for _ in range(3)] == [(True, False)] * 3
+    assert limiter.allow(1) == (False, True)
+    assert limiter.allow(1) == (False, False)
+
+    # Other users have their own bucket
+    assert limiter.allow(2) == (True, False)
+
+def test_refill_rate_and_cap(clock):
+    limiter = RateLimiter(burst=2, per_minute=60)  # one token a second
+    limiter.allow(1)
+    limiter.allow(1)
+    assert limiter.allow(1)[0] is False
+
+    clock.now += 1
+    assert limiter.allow(1) == (True, False)
+    assert limiter.allow(1)[0] is False
+
+    # Never more than `burst`, however long the user was idle
+    clock.now += 3600
+    assert [limiter.allow(1)[0] for _ in range(3)] == [True, True, False]
+
+def test_warning_rearms_after_success(clock):
+    limiter = RateLimiter(burst=1, per_minute=60)
+    limiter.allow(1)
+    assert limiter.allow(1) == (False, True)
+
+    clock.now += 1
+    assert limiter.allow(1) == (True, False)
+    assert limiter.allow(1) == (False, True)
+
+def test_sweep_drops_idle_users(clock):
+    limiter = RateLimiter(burst=2, per_minute=60)
+    limiter.SWEEP_EVERY = 3
+    limiter.allow(1)
+    limiter.allow(2)
+
+    clock.now += 10
+    limiter.allow(3)  # third call sweeps; 1 and 2 are full again
+    assert set(limiter.buckets) == {3}
+    # The sweeping call's own token is still taken
+    assert limiter.buckets[3][0] == 1
+
+# ==========================
+# COALESCING
+# ==========================
+
+def test_coalescer_drops_duplicates_while_running():
+    coalescer = Coalescer()
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        first, second = await asyncio.gather(
+            coalescer.run("k", slow), coalescer.run("k", slow)
+        )
+        assert (first, second) == ("done", None)
+        # Finished keys run again
+        assert await coalescer.run("k", slow) == "done"
+        assert not coalescer.in_flight
+
+    asyncio.run(main())
+    assert len(calls) == 2
+
+def test_coalescer_releases_key_on_error():
+    coalescer = Coalescer()
+
+    async def boom():
+        raise ValueError
+
+    async def main():
+        with pytest.raises(ValueError):
+            await coalescer.run("k", boom)
+        assert not coalescer.in_flight
+
+    asyncio.run(main())
+
+# ==========================
+# GUARDED
+# ==========================
+
+def _update(user_id, text=None, document=None):
+    replies = []
+
+    async def reply_text(msg):
+        replies.append(msg)
+
+    message = SimpleNamespace(text=text, document=document, reply_text=reply_text)
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id), message=message), replies
+
+def test_guarded_limits_and_coalesces(clock, monkeypatch):
+    monkeypatch.setattr(ratelimit, "limiter", RateLimiter(burst=2, per_minute=60))
+    monkeypatch.setattr(ratelimit, "coalescer", Coalescer())
+    handled = []
+
+    @ratelimit.guarded
+    async def handler(update, context):
+        handled.append(update.message.text or update.message.document.file_unique_id)
+        await asyncio.sleep(0.05)
+
+    async def main():
+        a, _ = _update(1, "/jobs")
+        b, _ = _update(1, "/jobs ")
+        # Same command while the first still runs: answered by the first
+        await asyncio.gather(handler(a, None), handler(b, None))
+        assert handled == ["/jobs"]
+
+        c, replies = _update(1, "/status")
+        await handler(c, None)
+        await handler(c, None)
+        assert handled == ["/jobs"]
+        assert len(replies) == 1 and "Too many requests" in replies[0]
+
+        # Two different uploads at once are not duplicates
+        clock.now += 60
+        d, _ = _update(1, document=SimpleNamespace(file_unique_id="f1"))
+        e, _ = _update(1, document=SimpleNamespace(file_unique_id="f2"))
+        await asyncio.gather(handler(d, None), handler(e, None))
+        assert handled == ["/jobs", "f1", "f2"]
+
+    asyncio.run(main())
@@ -0,0 +1,279 @@
+# Storage contract: the same cases against every backend. SQLite (single
+# file and sharded) always runs; PostgreSQL runs when DATABASE_URL points
+# at a scratch database, e.g.
+#
+#   DATABASE_URL=postgresql://localhost/jobs_test python -m pytest tests
+import asyncio
+import os
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import storage
+
+# ==========================
+# BACKENDS
+# ==========================
+
+def _sqlite(tmp_path):
+    return storage.SQLiteStorage(str(tmp_path / "jobs.db"))
+
+def _sharded(tmp_path):
+    return storage.ShardedSQLiteStorage(str(tmp_path / "jobs.db"), shard_count=3)
+
+def _postgres(tmp_path):
+    dsn = os.getenv("DATABASE_URL")
+    if not dsn:
+        pytest.skip("DATABASE_URL not set")
+    from storage_pg import PostgresStorage
+    return PostgresStorage(dsn)
+
+@pytest.fixture(params=[_sqlite, _sharded, _postgres], ids=["sqlite", "sharded", "postgres"])
+def run(request, tmp_path, monkeypatch):
+    # Snapshots restored on connect would come from here
+    monkeypatch.setattr(storage.backup, "BACKUP_DIR", str(tmp_path / "backups"))
+    db = request.param(tmp_path)
+
+    def run(case):
+        async def main():
+            await db.connect()
+            try:
+                await case(db)
+            finally:
+                await db.close()
+
+        asyncio.run(main())
+
+    return run
+
+def _user():
+    # Postgres is shared between runs, so every test gets fresh users
+    return random.randint(10**9, 2 * 10**9)
+
+def _iso(days_ago=0):
+    return (datetime.now(timezone.utc) - timedelta(days=days_ago)).isoformat()
+
+def _same_time(a, b):
+    return datetime.fromisoformat(a) == datetime.fromisoformat(b)
+
+# ==========================
+# APPLIED JOBS
+# ==========================
+
+def test_add_duplicate_remove(run):
+    user = _user()
+
+    async def case(db):
+        assert await db.add_applied(user, "Amazon", "DevOps Engineer", _iso(), 5, None)
+        # Case and spacing don't make a new entry
+        assert not await db.add_applied(user, " amazon ", "devops  engineer", _iso(), 7, None)
+        assert await db.add_applied(user, "Google", "SRE", _iso(), 3, "https://x/1")
+
+        rows = await db.list_applied(user)
+        assert [(r[0], r[1]) for r in rows] == [("Google", "SRE"), ("Amazon", "DevOps Engineer")]
+        assert await db.count_applied(user) == 2
+
+        assert await db.remove_applied(user, "AMAZON", "devops engineer") == 1
+        assert await db.remove_applied(user, "Amazon", "DevOps Engineer") == 0
+        assert await db.count_applied(user) == 1
+
+        await db.remove_all_applied(user)
+        assert await db.list_applied(user) == []
+
+    run(case)
+
+def test_import_export(run):
+    user = _user()
+
+    async def case(db):
+        await db.add_applied(user, "Amazon", "SRE", _iso(days_ago=30), 5, None)
+
+        rows = [
+            ("amazon", "sre", _iso(days_ago=1), 9, "https://x/amazon"),
+            ("Google", "SRE", _iso(days_ago=3), 4, None),
+            ("Meta", "Data Engineer", _iso(days_ago=2), 6, "https://x/meta"),
+            # Repeated within the file (and batch): an update of the line above
+            ("META", "data engineer", _iso(), 8, None),
+        ]
+        # batch=2 so the upsert spans more than one round
+        assert await db.import_applied(user, iter(rows), 2) == (2, 2)
+
+        exported = []
+        async for batch in db.export_applied(user, 2):
+            assert len(batch) <= 2
+            exported.extend(batch)
+
+        # Oldest first; existing entries kept their name, applied_at and link
+        assert [(r[0], r[1], r[3], r[4]) for r in exported] == [
+            ("Amazon", "SRE", 9, "https://x/amazon"),
+            ("Google", "SRE", 4, None),
+            ("Meta", "Data Engineer", 8, "https://x/meta"),
+        ]
+        assert _same_time(exported[1][2], rows[1][2])
+        assert _same_time(exported[2][2], rows[2][2])
+
+        assert await db.count_applied(user) == 3
+        await db.remove_all_applied(user)
+
+    run(case)
+
+def test_search(run):
+    user, other = _user(), _user()
+
+    async def case(db):
+        await db.add_applied(user, "Kubernetes Labs", "Backend Engineer", _iso(days_ago=5), 5, None)
+        await db.add_applied(user, "Acme", "Kubernetes Admin", _iso(days_ago=4), 5, None)
+        await db.add_applied(
+            user, "Acme", "Data Engineer", _iso(days_ago=1), 5, "https://jobs.x/kubernetes-platform"
+        )
+        await db.add_applied(user, "Globex", "SRE", _iso(days_ago=2), 5, None)
+        await db.add_applied(other, "Kubernetes Inc", "SRE", _iso(), 5, None)
+
+        def names(rows):
+            return [(r[0], r[1]) for r in rows]
+
+        # Prefixes, any case; company beats role beats link, even when newer
+        found = await db.search_applied(user, "KUBE", 10)
+        assert names(found) == [
+            ("Kubernetes Labs", "Backend Engineer"),
+            ("Acme", "Kubernetes Admin"),
+            ("Acme", "Data Engineer"),
+        ]
+        assert found[2][4] == "https://jobs.x/kubernetes-platform"
+
+        # Every term must match, in any column
+        assert sorted(names(await db.search_applied(user, "kub eng", 10))) == [
+            ("Acme", "Data Engineer"), ("Kubernetes Labs", "Backend Engineer"),
+        ]
+
+        # Pages
+        assert await db.search_applied(user, "kube", 2) == found[:2]
+        assert await db.search_applied(user, "kube", 2, offset=2) == found[2:]
+
+        # Only the caller's own entries; query syntax is never interpreted
+        assert names(await db.search_applied(other, "kube", 10)) == [("Kubernetes Inc", "SRE")]
+        assert names(await db.search_applied(user, '"SRE*:(', 10)) == [("Globex", "SRE")]
+        assert await db.search_applied(user, "!!", 10) == []
+
+        # The index follows removals and upserts
+        await db.remove_applied(user, "Kubernetes Labs", "Backend Engineer")
+        await db.import_applied(user, [("globex", "sre", _iso(), 5, "https://x/terraform")])
+        assert names(await db.search_applied(user, "kube", 10)) == names(found[1:])
+        assert names(await db.search_applied(user, "terra", 10)) == [("Globex", "SRE")]
+
+        await db.remove_all_applied(user)
+        await db.remove_all_applied(other)
+        assert await db.search_applied(user, "acme", 10) == []
+
+    run(case)
+
+def _this_week():
+    today = datetime.now(timezone.utc).date()
+    return (today - timedelta(days=today.weekday())).isoformat()
+
+def test_status_counts(run):
+    user = _user()
+
+    async def case(db):
+        assert await db.get_status(user, _iso()) is None
+
+        await db.activate_user(user)
+        await db.add_applied(user, "Amazon", "SRE", _iso(days_ago=10), 5, None)
+        await db.add_applied(user, "Google", "SRE", _iso(days_ago=1), 5, None)
+        await db.add_applied(user, "Meta", "SRE", _iso(days_ago=1), 5, None)
+
+        profile, applied, due = await db.get_status(user, _iso())
+        assert profile.user_id == user and profile.active == 1
+        assert (applied, due) == (3, 1)
+
+        await db.remove_applied(user, "Amazon", "SRE")
+        assert (await db.get_status(user, _iso()))[1:] == (2, 0)
+
+        assert await db.remove_all_applied(user) == 2
+        assert (await db.get_status(user, _iso()))[1:] == (0, 0)
+
+        # Every removed entry counts as ignored in the weekly summary
+        week = await db.weekly_activity(_this_week())
+        assert (user, "ignore", 3) in week
+
+    run(case)
+
+def test_weekly_activity_skips_undeliverable(run):
+    users = [_user() for _ in range(3)]
+
+    async def case(db):
+        for user in users:
+            await db.activate_user(user)
+            await db.log_action(user, "apply", _iso())
+        await db.set_active(users[1], 0)
+        await db.mark_unreachable(users[2], "blocked", _iso())
+
+        week = await db.weekly_activity(_this_week())
+        assert [r for r in week if r[0] in users] == [(users[0], "apply", 1)]
+
+        # /start makes them reachable again
+        await db.activate_user(users[2])
+        week = await db.weekly_activity(_this_week())
+        assert {r[0] for r in week if r[0] in users} == {users[0], users[2]}
+
+    run(case)
+
+# ==========================
+# LEASES / WORK PARTITIONS
+# ==========================
+
+def test_lease(run):
+    name = f"test-{uuid.uuid4().hex}"
+
+    async def case(db):
+        now = 1_000_000.0
+        assert await db.acquire_lease(name, "a", 60, now)
+        assert not await db.acquire_lease(name, "b", 60, now + 1)
+        # The holder renews; someone else only gets it once it expired
+        assert await db.acquire_lease(name, "a", 60, now + 30)
+        assert not await db.acquire_lease(name, "b", 60, now + 89)
+        assert await db.acquire_lease(name, "b", 60, now + 91)
+
+        await db.release_lease(name, "a")  # not the holder: no effect
+        assert not await db.acquire_lease(name, "a", 60, now + 92)
+        await db.release_lease(name, "b")
+        assert await db.acquire_lease(name, "a", 60, now + 93)
+        await db.release_lease(name, "a")
+
+    run(case)
+
+def test_claim_partitions(run):
+    run_id = f"test:{uuid.uuid4().hex}"
+
+    async def case(db):
+        now = 1_000_000.0
+        await db.create_work_partitions(run_id, 3, now)
+        await db.create_work_partitions(run_id, 3, now)  # second replica: no-op
+
+        claimed = [await db.claim_partition(run_id, "a", now, now - 600) for _ in range(3)]
+        assert sorted(claimed) == [0, 1, 2]
+        assert await db.claim_partition(run_id, "b", now, now - 600) is None
+
+        await db.complete_partition(run_id, 0, "a")
+        await db.complete_partition(run_id, 1, "b")  # not the owner
+        assert await db.unfinished_partitions(run_id) == 2
+
+        # Renewed claims stay put; stale ones are taken over
+        assert await db.renew_claim(run_id, 1, "a", now + 500)
+        assert await db.claim_partition(run_id, "b", now + 700, now + 100) == 2
+        assert not await db.renew_claim(run_id, 2, "a", now + 700)
+        assert await db.claim_partition(run_id, "b", now + 700, now + 100) is None
+
+        # Released partitions are claimable at once
+        await db.release_partition(run_id, 1, "a")
+        assert await db.claim_partition(run_id, "b", now + 701, now + 100) == 1
+
+        assert (run_id, 3) in await db.unfinished_runs(now - 1)
+        await db.complete_partition(run_id, 1, "b")
+        await db.complete_partition(run_id, 2, "b")
+        assert await db.unfinished_partitions(run_id) == 0
+        assert run_id not in [r for r, _ in await db.unfinished_runs(now - 1)]
+
+    run(case)
@@ -0,0 +1,276 @@
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+from telegram.request import HTTPXRequest
+
+from metrics import TRACE_SPANS_DROPPED, TRACE_SPANS_EXPORTED
+
+# ==========================
+# CONFIG
+# ==========================
+
+# off | file | otlp
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "off").lower()
+TRACE_FILE = os.getenv("TRACE_FILE", "/data/traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv(
+    "TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"
+)
+
+# Head sampling: the decision is made once per update / job run and every
+# child span follows it, so unsampled work costs one random() call
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.05"))
+
+# Scheduled broadcasts run a few times a day, so they're traced by default
+TRACE_JOB_SAMPLE_RATE = float(os.getenv("TRACE_JOB_SAMPLE_RATE", "1.0"))
+
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "512"))
+TRACE_FLUSH_INTERVAL = float(os.getenv("TRACE_FLUSH_INTERVAL", "5"))
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+
+SERVICE_NAME = os.getenv("SERVICE_NAME", "job-seeker-bot")
+
+ENABLED = TRACE_EXPORTER in ("file", "otlp")
+
+# ==========================
+# SPANS
+# ==========================
+
+_current = contextvars.ContextVar("trace_span", default=None)
+
+class Span:
+    __slots__ = (
+        "trace_id", "span_id", "parent_id", "name",
+        "attributes", "start_ns", "end_ns", "error",
+    )
+
+    def __init__(self, name, trace_id, parent_id, attributes, start_ns=None):
+        self.trace_id = trace_id
+        self.span_id = random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def end(self, end_ns=None):
+        self.end_ns = end_ns or time.time_ns()
+        _exporter.submit(self)
+
+def current():
+    return _current.get()
+
+def start_span(name, parent=None, root=False, rate=None, start_ns=None,
+               **attributes):
+    # -> Span, or None when not traced. Child spans need a sampled parent
+    # (explicit, or the one active in this task); root=True starts a new
+    # trace subject to `rate` (TRACE_SAMPLE_RATE by default).
+    if not ENABLED:
+        return None
+
+    parent = parent or _current.get()
+    if parent is not None:
+        return Span(name, parent.trace_id, parent.span_id, attributes, start_ns)
+
+    if root and random.random() < (TRACE_SAMPLE_RATE if rate is None else rate):
+        return Span(name, random.getrandbits(128), None, attributes, start_ns)
+
+    return None
+
+@contextlib.contextmanager
+def span(name, root=False, rate=None, **attributes):
+    # Opens a span and makes it the parent of spans started inside the block
+    s = start_span(name, root=root, rate=rate, **attributes)
+    if s is None:
+        yield None
+        return
+
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        s.end()
+
+def record(name, start_ns, end_ns, error=None, **attributes):
+    # Child span for work timed elsewhere (e.g. asyncpg's query logger)
+    s = start_span(name, start_ns=start_ns, **attributes)
+    if s is not None:
+        s.error = error
+        s.end(end_ns)
+
+def instrument(name=None):
+    # Decorator: child span around a plain function
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(span_name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+    return decorator
+
+def traced(callback):
+    # Root span per incoming update
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        user = update.effective_user
+        with span(
+            f"update {callback.__name__}", root=True,
+            **{"user.id": user.id if user else None}
+        ):
+            return await callback(update, context)
+
+    return wrapper
+
+class TracedRequest(HTTPXRequest):
+    # Child span per Bot API call (sendMessage, sendDocument, ...)
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        # url ends in /bot<token>/<method>; only the method is kept
+        with span(
+            f"bot {url.rsplit('/', 1)[-1]}", **{"http.method": method}
+        ) as s:
+            code, payload = await super().do_request(
+                url, method, request_data, **kwargs
+            )
+            if s is not None:
+                s.set("http.status_code", code)
+            return code, payload
+
+# ==========================
+# EXPORT
+# ==========================
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+def _otlp_span(s):
+    # OTLP/JSON span encoding, so either sink can be read by the same tools
+    encoded = {
+        "traceId": f"{s.trace_id:032x}",
+        "spanId": f"{s.span_id:016x}",
+        "name": s.name,
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns),
+        "attributes": [
+            _attribute(k, v) for k, v in s.attributes.items() if v is not None
+        ],
+        "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+    }
+    if s.parent_id is not None:
+        encoded["parentSpanId"] = f"{s.parent_id:016x}"
+    return encoded
+
+class Exporter:
+    # Finished spans go on a bounded queue; a daemon thread batches them to
+    # the sink. When the sink falls behind spans are dropped, never awaited.
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, s):
+        # Spans also end on the SQLite writer thread, hence the lock
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(
+                        target=self._run, name="trace-exporter", daemon=True
+                    )
+                    self.thread.start()
+        try:
+            self.queue.put_nowait(s)
+        except queue.Full:
+            TRACE_SPANS_DROPPED.inc()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._drain(TRACE_FLUSH_INTERVAL)
+            if batch:
+                self._export(batch)
+
+    def _drain(self, timeout):
+        # -> (spans, stop): a None on the queue is the shutdown sentinel
+        batch = []
+        deadline = time.monotonic() + timeout
+        while len(batch) < TRACE_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                s = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if s is None:
+                return batch, True
+            batch.append(s)
+        return batch, False
+
+    def _export(self, batch):
+        spans = [_otlp_span(s) for s in batch]
+        try:
+            if TRACE_EXPORTER == "file":
+                with open(TRACE_FILE, "a") as f:
+                    f.writelines(json.dumps(s) + "\n" for s in spans)
+            else:
+                import urllib.request  # only needed for OTLP export
+
+                body = json.dumps({"resourceSpans": [{
+                    "resource": {"attributes": [
+                        _attribute("service.name", SERVICE_NAME)
+                    ]},
+                    "scopeSpans": [{"scope": {"name": "tracing"}, "spans": spans}],
+                }]}).encode()
+                request = urllib.request.Request(
+                    TRACE_OTLP_ENDPOINT, data=body,
+                    headers={"Content-Type": "application/json"}
+                )
+                urllib.request.urlopen(request, timeout=10).close()
+            TRACE_SPANS_EXPORTED.inc(len(spans))
+        except Exception as e:
+            TRACE_SPANS_DROPPED.inc(len(spans))
+            logging.warning(f"Trace export failed, {len(spans)} span(s) dropped: {e}")
+
+    def flush(self, timeout=10):
+        # Called on shutdown: the exporter thread writes what's still
+        # queued, then exits
+        if self.thread is None:
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self.thread.join(timeout)
+
+_exporter = Exporter()
+
+def shutdown():
+    if ENABLED:
+        _exporter.flush()